@@ -0,0 +1,125 @@
+"""
+Compiled Random Forest
+Flattens a fitted RandomForestClassifier (plus its StandardScaler) into
+contiguous NumPy arrays and scores rows with pure NumPy, avoiding sklearn's
+per-call input validation and joblib thread dispatch.
+"""
+
+import numpy as np
+
+# Array names that make up a compiled model (also the on-disk layout)
+ARRAY_NAMES = (
+    "feature", "threshold", "children_left", "children_right",
+    "leaf_proba", "roots", "scaler_mean", "scaler_scale", "classes"
+)
+
+# Rows traversed together; keeps (rows x trees) index arrays a few MB
+BLOCK_ROWS = 4096
+
+
+class CompiledForest:
+    """
+    All trees concatenated into one node table:
+
+    - feature[n], threshold[n]            split of node n
+    - children_left[n], children_right[n] global node ids; leaves point to
+                                          themselves so traversal needs no masks
+    - leaf_proba[n]                       class probabilities of node n
+    - roots[t]                            node id of the root of tree t
+
+    predict_proba() matches RandomForestClassifier.predict_proba on scaled
+    input: features are compared as float32 (like sklearn's trees) and tree
+    probabilities are summed in tree order before averaging.
+    """
+
+    def __init__(self, arrays: dict):
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.n_trees = len(self.roots)
+        self.n_features = len(self.scaler_mean)
+        # Depth bound for the traversal loop
+        self.max_depth = int(arrays.get("max_depth", 64))
+
+    @classmethod
+    def from_sklearn(cls, model, scaler):
+        """Flatten a fitted RandomForestClassifier and StandardScaler"""
+        features, thresholds, lefts, rights, probas, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(n_nodes) + offset
+
+            value = tree.value[:, 0, :].astype(np.float64)
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.intp))
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset).astype(np.intp))
+            rights.append(np.where(is_leaf, node_ids, tree.children_right + offset).astype(np.intp))
+            probas.append(value / normalizer)
+            roots.append(offset)
+
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls({
+            "feature": np.ascontiguousarray(np.concatenate(features)),
+            "threshold": np.ascontiguousarray(np.concatenate(thresholds)),
+            "children_left": np.ascontiguousarray(np.concatenate(lefts)),
+            "children_right": np.ascontiguousarray(np.concatenate(rights)),
+            "leaf_proba": np.ascontiguousarray(np.concatenate(probas)),
+            "roots": np.asarray(roots, dtype=np.intp),
+            "scaler_mean": np.asarray(scaler.mean_, dtype=np.float64),
+            "scaler_scale": np.asarray(scaler.scale_, dtype=np.float64),
+            "classes": np.asarray(model.classes_),
+            "max_depth": max_depth
+        })
+
+    def arrays(self) -> dict:
+        """The flat arrays backing this model"""
+        arrays = {name: getattr(self, name) for name in ARRAY_NAMES}
+        arrays["max_depth"] = np.asarray(self.max_depth)
+        return arrays
+
+    def transform(self, X):
+        """StandardScaler.transform"""
+        return (np.asarray(X, dtype=np.float64) - self.scaler_mean) / self.scaler_scale
+
+    def predict_proba_scaled(self, X_scaled):
+        """Class probabilities for already-scaled rows"""
+        X32 = np.ascontiguousarray(X_scaled, dtype=np.float32)
+        if X32.shape[0] > BLOCK_ROWS:
+            # Bound the (rows x trees) working arrays
+            return np.vstack([
+                self._predict_block(X32[start:start + BLOCK_ROWS])
+                for start in range(0, X32.shape[0], BLOCK_ROWS)
+            ])
+        return self._predict_block(X32)
+
+    def _predict_block(self, X32):
+        n_rows = X32.shape[0]
+        flat_X = X32.ravel()
+        row_base = (np.arange(n_rows, dtype=np.intp) * self.n_features)[:, None]
+
+        # (rows x trees) current node; every tree advances one level per step,
+        # trees that already reached a leaf stay on it
+        nodes = np.broadcast_to(self.roots, (n_rows, self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            go_left = flat_X[row_base + self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.children_left[nodes], self.children_right[nodes])
+
+        # Reducing over the tree axis adds trees in order, like sklearn
+        return self.leaf_proba[nodes].sum(axis=1) / self.n_trees
+
+    def predict_proba(self, X):
+        """Scale raw feature rows and return class probabilities"""
+        return self.predict_proba_scaled(self.transform(X))
+
+    def predict(self, X):
+        """Most probable class per row (RandomForestClassifier.predict)"""
+        return self.classes[np.argmax(self.predict_proba(X), axis=1)]
@@ -0,0 +1,421 @@
+"""
+Per-Patient Feature Store
+One row per subject in a memory-mapped float32 matrix of '{test}_value'
+features (latest value per test), plus each patient's max status label.
+Kept current incrementally from lab_interpretations ids, so inference is an
+array lookup and training is a slice instead of a rebuild from raw rows.
+
+Files (under FEATURE_STORE_DIR):
+- values.npy    float32 (capacity x n_features), NaN = no value yet
+- subjects.npy  int64   (capacity,) subject_id of each row
+- risk.npy      int8    (capacity,) max status (0 NORMAL, 1 ABNORMAL, 2 CRITICAL)
+- labelled.npy  int8    (capacity,) 1 if the patient has a valued row with a
+                status (training only uses these, like prepare_training_data)
+- manifest.json columns, row count, the lab id watermark, the first lab id
+                the store was built from and the database identity (detect
+                a cleared table or a replaced database file)
+- .lock         held by whichever process is loading or syncing
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, keep to one process per store
+    fcntl = None
+
+from database.db import get_read_connection as get_db
+from database.repository import DB_IDENTITY_KEY
+
+FEATURE_STORE_DIR = "data/feature_store"
+
+# Lab rows applied per fetchmany() during sync
+SYNC_CHUNK_SIZE = 100000
+INITIAL_CAPACITY = 1024
+
+STATUS_RISK = {'NORMAL': 0, 'ABNORMAL': 1, 'CRITICAL': 2}
+
+
+def feature_base(test_name: str) -> str:
+    """Normalized test name used as feature prefix (e.g. 'Urea Nitrogen' -> 'urea_nitrogen')"""
+    return test_name.lower().replace(' ', '_').replace('-', '_')
+
+
+def feature_name(test_name: str) -> str:
+    """Latest-value feature column for a lab test name"""
+    return f"{feature_base(test_name)}_value"
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    """What readers see; sync() publishes a new one when it is done"""
+    columns: tuple
+    col_index: dict
+    row_index: dict
+    n_rows: int
+    values: np.ndarray
+    subjects: np.ndarray
+    risk: np.ndarray
+    labelled: np.ndarray
+
+
+class FeatureStore:
+    """
+    Memory-mapped patient x feature matrix with a subject_id -> row index.
+
+    sync() runs under a thread lock and a file lock on the store directory,
+    so any number of processes can sync the same files: each one reloads
+    from the manifest first if another process synced since.
+    Reads go through the last published snapshot and never wait on a sync.
+    Cells are only ever overwritten with newer lab values, so a read during
+    a sync can at most see some of that sync's values early.
+    """
+
+    def __init__(self, directory: str = FEATURE_STORE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.columns = []
+        self._col_index = {}
+        self._row_index = {}
+        self.n_rows = 0
+        self.watermark = 0
+        self.first_id = 0
+        self.db_identity = None
+        self._values = None
+        self._subjects = None
+        self._risk = None
+        self._labelled = None
+        self._snapshot = None
+        with self._lock, self._file_lock():
+            self._load()
+
+    # ---------------- persistence ----------------
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive across processes (released when the file is closed)"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(".lock"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _read_manifest(self):
+        manifest_path = self._path("manifest.json")
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path) as f:
+            return json.load(f)
+
+    def _manifest(self):
+        return {
+            "columns": self.columns,
+            "n_rows": self.n_rows,
+            "watermark": self.watermark,
+            "first_id": self.first_id,
+            "db_identity": self.db_identity
+        }
+
+    def _load(self):
+        manifest = self._read_manifest()
+        if manifest is None or not os.path.exists(self._path("labelled.npy")):
+            # New store, or one from before labelled.npy: rebuilt on the next sync
+            self._reset()
+            return
+
+        self.columns = manifest["columns"]
+        self._col_index = {c: i for i, c in enumerate(self.columns)}
+        self.n_rows = manifest["n_rows"]
+        self.watermark = manifest["watermark"]
+        # Stores written before first_id existed are rebuilt on the next sync
+        self.first_id = manifest.get("first_id", 0)
+        self.db_identity = manifest.get("db_identity")
+        self._map_arrays()
+        self._row_index = {int(s): i for i, s in enumerate(self._subjects[:self.n_rows])}
+        self._publish()
+
+    def _publish(self):
+        self._snapshot = _Snapshot(
+            columns=tuple(self.columns),
+            col_index=dict(self._col_index),
+            row_index=dict(self._row_index),
+            n_rows=self.n_rows,
+            values=self._values,
+            subjects=self._subjects,
+            risk=self._risk,
+            labelled=self._labelled
+        )
+
+    def _allocate(self, capacity, width):
+        """(Re)create the memory-mapped files, copying existing rows over"""
+        os.makedirs(self.directory, exist_ok=True)
+
+        values = np.lib.format.open_memmap(
+            self._path("values.npy.tmp"), mode="w+", dtype=np.float32,
+            shape=(capacity, max(width, 1))
+        )
+        values[:] = np.nan
+        subjects = np.lib.format.open_memmap(
+            self._path("subjects.npy.tmp"), mode="w+", dtype=np.int64, shape=(capacity,)
+        )
+        risk = np.lib.format.open_memmap(
+            self._path("risk.npy.tmp"), mode="w+", dtype=np.int8, shape=(capacity,)
+        )
+        risk[:] = 0
+        labelled = np.lib.format.open_memmap(
+            self._path("labelled.npy.tmp"), mode="w+", dtype=np.int8, shape=(capacity,)
+        )
+        labelled[:] = 0
+
+        if self._values is not None and self.n_rows:
+            n, old_width = self.n_rows, self._values.shape[1]
+            values[:n, :old_width] = self._values[:n]
+            subjects[:n] = self._subjects[:n]
+            risk[:n] = self._risk[:n]
+            labelled[:n] = self._labelled[:n]
+
+        for array, name in ((values, "values.npy"), (subjects, "subjects.npy"),
+                            (risk, "risk.npy"), (labelled, "labelled.npy")):
+            array.flush()
+            del array
+            os.replace(self._path(name + ".tmp"), self._path(name))
+
+        self._map_arrays()
+
+    def _map_arrays(self):
+        self._values = np.load(self._path("values.npy"), mmap_mode="r+")
+        self._subjects = np.load(self._path("subjects.npy"), mmap_mode="r+")
+        self._risk = np.load(self._path("risk.npy"), mmap_mode="r+")
+        self._labelled = np.load(self._path("labelled.npy"), mmap_mode="r+")
+
+    def _write_manifest(self):
+        tmp_path = self._path("manifest.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._manifest(), f)
+        os.replace(tmp_path, self._path("manifest.json"))
+
+    def _reset(self, db_identity=None):
+        self._values = self._subjects = self._risk = self._labelled = None
+        self.n_rows = 0
+        self.watermark = 0
+        self.first_id = 0
+        self.db_identity = db_identity
+        self._row_index = {}
+        self.columns = []
+        self._col_index = {}
+        self._allocate(INITIAL_CAPACITY, 0)
+        self._write_manifest()
+        self._publish()
+
+    # ---------------- incremental updates ----------------
+
+    def _ensure_room(self, n_rows, n_cols):
+        """Grow the files (doubling rows) when new patients or tests arrive"""
+        capacity, width = self._values.shape
+        if n_rows <= capacity and n_cols <= width:
+            return
+
+        while capacity < n_rows:
+            capacity *= 2
+        self._allocate(capacity, max(width, n_cols))
+
+    def _apply_chunk(self, chunk):
+        """Apply lab rows (id order) to the matrix"""
+        columns = list(self.columns)
+        col_index = dict(self._col_index)
+        row_index = self._row_index
+        next_row = self.n_rows
+        new_subjects = []
+
+        rows = np.empty(len(chunk), dtype=np.int64)
+        cols = np.full(len(chunk), -1, dtype=np.int64)
+        values = np.empty(len(chunk), dtype=np.float32)
+        risks = np.empty(len(chunk), dtype=np.int8)
+        labels = np.zeros(len(chunk), dtype=np.int8)
+        test_cols = {}
+
+        for i, (subject_id, test_name, value, status) in enumerate(chunk):
+            row = row_index.get(subject_id)
+            if row is None:
+                row = row_index[subject_id] = next_row
+                new_subjects.append(subject_id)
+                next_row += 1
+            rows[i] = row
+            if value is None:
+                # Like training: only rows with a value count towards the label
+                risks[i] = 0
+                continue
+            risks[i] = STATUS_RISK.get(status, 0)
+            labels[i] = status is not None
+            col = test_cols.get(test_name)
+            if col is None:
+                name = feature_name(test_name)
+                col = col_index.get(name)
+                if col is None:
+                    col = col_index[name] = len(columns)
+                    columns.append(name)
+                test_cols[test_name] = col
+            cols[i] = col
+            values[i] = value
+
+        self._ensure_room(next_row, len(columns))
+        self.columns = columns
+        self._col_index = col_index
+
+        if new_subjects:
+            self._subjects[self.n_rows:next_row] = new_subjects
+            self.n_rows = next_row
+
+        # Latest value per (row, col) - rows arrive in id order
+        has_value = cols >= 0
+        r, c, v = rows[has_value], cols[has_value], values[has_value]
+        if len(r):
+            cells = r * self._values.shape[1] + c
+            _, last_rev = np.unique(cells[::-1], return_index=True)
+            last = len(cells) - 1 - last_rev
+            self._values[r[last], c[last]] = v[last]
+
+        np.maximum.at(self._risk, rows, risks)
+        np.maximum.at(self._labelled, rows, labels)
+
+    def sync(self):
+        """
+        Apply lab rows inserted since the last sync.
+        Cheap (MIN(id) / MAX(id) lookups) when nothing new has landed.
+        Returns: number of lab rows applied
+        """
+        with self._lock, self._file_lock():
+            if self._read_manifest() != self._manifest():
+                # Another process synced (or reset) the files since
+                self._load()
+
+            conn = get_db()
+            cur = conn.cursor()
+            # Separate subqueries: each is a single rowid seek
+            cur.execute("""
+                SELECT
+                    COALESCE((SELECT MIN(id) FROM lab_interpretations), 0) AS first_id,
+                    COALESCE((SELECT MAX(id) FROM lab_interpretations), 0) AS max_id
+            """)
+            row = cur.fetchone()
+            first_id, high = row["first_id"], row["max_id"]
+            cur.execute("SELECT value FROM app_meta WHERE key = ?", (DB_IDENTITY_KEY,))
+            row = cur.fetchone()
+            db_identity = row["value"] if row else None
+
+            if db_identity != self.db_identity:
+                # A different database file (deleted and recreated): its ids
+                # say nothing about what this store holds - start over
+                self._reset(db_identity)
+            elif self.watermark and (high < self.watermark or first_id != self.first_id):
+                # Table was cleared / rebuilt (ids are never reused, so a new
+                # first id means the rows this store holds are gone) - start over
+                self._reset(db_identity)
+            if high == self.watermark:
+                conn.close()
+                return 0
+
+            cur.execute("""
+                SELECT subject_id, test_name, value, status
+                FROM lab_interpretations
+                WHERE id > ? AND id <= ?
+                ORDER BY id
+            """, (self.watermark, high))
+
+            applied = 0
+            while True:
+                chunk = cur.fetchmany(SYNC_CHUNK_SIZE)
+                if not chunk:
+                    break
+                self._apply_chunk(chunk)
+                applied += len(chunk)
+            conn.close()
+
+            self._values.flush()
+            self._subjects.flush()
+            self._risk.flush()
+            self._labelled.flush()
+            self.watermark = high
+            self.first_id = first_id
+            self._write_manifest()
+            self._publish()
+            return applied
+
+    # ---------------- reads ----------------
+
+    def subject_ids(self):
+        """All stored subject ids, in row order (only patients with a lab value)"""
+        snap = self._snapshot
+        n = snap.n_rows
+        has_value = ~np.isnan(snap.values[:n, :len(snap.columns)]).all(axis=1)
+        return [int(s) for s in snap.subjects[:n][has_value]]
+
+    def lookup(self, subject_ids, feature_cols, fill_value=0.0):
+        """
+        Feature matrix for the given subjects in model column order.
+        Returns: (found_ids, X) - subjects without any lab value are skipped
+        """
+        snap = self._snapshot
+        found, rows = [], []
+        for s in subject_ids:
+            row = snap.row_index.get(int(s))
+            if row is not None:
+                found.append(int(s))
+                rows.append(row)
+
+        cols = [snap.col_index.get(c, -1) for c in feature_cols]
+        X = np.full((len(rows), len(feature_cols)), fill_value, dtype=np.float64)
+        if rows:
+            block = snap.values[np.asarray(rows)][:, :len(snap.columns)]
+            for j, col in enumerate(cols):
+                if col >= 0:
+                    X[:, j] = block[:, col]
+            X[np.isnan(X)] = fill_value
+
+            # Same rule as the SQL path: patients need at least one value
+            has_value = ~np.isnan(block).all(axis=1)
+            if not has_value.all():
+                found = [s for s, keep in zip(found, has_value) if keep]
+                X = X[has_value]
+
+        return found, X
+
+    def training_slice(self):
+        """
+        (X, y, feature_cols, subject_ids) for every stored patient with at
+        least one valued, labelled (status not NULL) row, the patients
+        prepare_training_data uses; X keeps NaN for missing features
+        """
+        snap = self._snapshot
+        n, width = snap.n_rows, len(snap.columns)
+        X = snap.values[:n, :width]
+        has_value = ~np.isnan(X).all(axis=1) & (snap.labelled[:n] > 0)
+        return (
+            np.asarray(X[has_value]),
+            np.asarray(snap.risk[:n][has_value], dtype=np.int64),
+            list(snap.columns),
+            np.asarray(snap.subjects[:n][has_value])
+        )
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_feature_store() -> FeatureStore:
+    """Process-wide feature store, opened on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = FeatureStore()
+    return _store
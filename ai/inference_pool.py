@@ -0,0 +1,84 @@
+"""
+Risk Inference Worker Pool
+Runs CPU-bound model scoring off the asyncio event loop so streaming chat
+(SSE) and other requests keep flowing while predictions are computed.
+
+Configuration (environment variables):
+- RISK_INFERENCE_MODE     'thread' (default) or 'process'
+- RISK_INFERENCE_WORKERS  pool size (default: CPU count)
+- RISK_INFERENCE_QUEUE    max calls admitted at once, running + waiting (default: 4 x workers)
+- RISK_INFERENCE_TIMEOUT  seconds a call may wait for a slot before being rejected (default: 5)
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+INFERENCE_MODE = os.getenv("RISK_INFERENCE_MODE", "thread")
+INFERENCE_WORKERS = int(os.getenv("RISK_INFERENCE_WORKERS", os.cpu_count() or 2))
+INFERENCE_QUEUE = int(os.getenv("RISK_INFERENCE_QUEUE", 4 * INFERENCE_WORKERS))
+INFERENCE_TIMEOUT = float(os.getenv("RISK_INFERENCE_TIMEOUT", 5))
+
+
+class InferenceBusyError(RuntimeError):
+    """Raised when the inference queue stays full for longer than the timeout"""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = None
+
+
+def get_executor():
+    """Lazily create the shared thread or process pool"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                if INFERENCE_MODE == "process":
+                    _executor = ProcessPoolExecutor(max_workers=INFERENCE_WORKERS)
+                else:
+                    _executor = ThreadPoolExecutor(
+                        max_workers=INFERENCE_WORKERS,
+                        thread_name_prefix="risk-inference"
+                    )
+    return _executor
+
+
+def _get_slots():
+    # Created on first use so it binds to the server's running loop
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(INFERENCE_QUEUE)
+    return _slots
+
+
+async def run_inference(fn, *args):
+    """
+    Await fn(*args) on the inference pool.
+
+    At most RISK_INFERENCE_QUEUE calls are admitted at once; further callers
+    wait up to RISK_INFERENCE_TIMEOUT seconds and then get InferenceBusyError.
+    In process mode fn and args must be picklable (module-level functions).
+    """
+    slots = _get_slots()
+    try:
+        await asyncio.wait_for(slots.acquire(), timeout=INFERENCE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise InferenceBusyError("Risk inference queue is full, please retry shortly")
+
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor(), fn, *args)
+    finally:
+        slots.release()
+
+
+def shutdown_inference_pool():
+    """Stop the pool (called on app shutdown)"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
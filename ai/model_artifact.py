@@ -0,0 +1,164 @@
+"""
+Versioned Risk Model Artifact
+One directory per trained model holding a manifest plus the compiled forest
+as .npy arrays, loaded with mmap so every worker process shares the same
+page-cache pages.
+
+Layout (under ARTIFACT_DIR):
+- CURRENT                 name of the active version (swapped atomically)
+- <version>/manifest.json version, feature_cols, array index, training metrics
+- <version>/<array>.npy   CompiledForest arrays
+- <version>/estimator.pkl sklearn model + scaler (tooling only, never loaded to serve)
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+from datetime import datetime
+
+import numpy as np
+
+from ai.compiled_forest import ARRAY_NAMES, CompiledForest
+
+ARTIFACT_DIR = "ai/models/risk_model"
+ARTIFACT_FORMAT = 1
+
+# Old versions kept next to the active one (for rollback / in-flight readers)
+KEEP_VERSIONS = 3
+
+
+def _fsync_file(path):
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+
+
+def current_version_path(artifact_dir: str = ARTIFACT_DIR) -> str:
+    return os.path.join(artifact_dir, "CURRENT")
+
+
+def read_current_version(artifact_dir: str = ARTIFACT_DIR):
+    """Active version name, or None if no artifact was written yet"""
+    try:
+        with open(current_version_path(artifact_dir)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def save_artifact(compiled: CompiledForest, feature_cols, model=None, scaler=None,
+                  metrics: dict = None, artifact_dir: str = ARTIFACT_DIR) -> str:
+    """
+    Write a new model version and make it current.
+
+    Files go to a temporary directory first, are fsynced, renamed into place,
+    and only then is CURRENT replaced - readers see either the old or the new
+    model, never a mix.
+    Returns: the new version name
+    """
+    os.makedirs(artifact_dir, exist_ok=True)
+    arrays = compiled.arrays()
+
+    digest = hashlib.sha256()
+    for name in ARRAY_NAMES:
+        digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+    version = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{digest.hexdigest()[:12]}"
+
+    tmp_dir = os.path.join(artifact_dir, f".tmp-{version}-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    index = {}
+    for name in ARRAY_NAMES:
+        array = np.ascontiguousarray(arrays[name])
+        file_name = f"{name}.npy"
+        np.save(os.path.join(tmp_dir, file_name), array)
+        _fsync_file(os.path.join(tmp_dir, file_name))
+        index[name] = {"file": file_name, "dtype": str(array.dtype), "shape": list(array.shape)}
+
+    if model is not None:
+        with open(os.path.join(tmp_dir, "estimator.pkl"), "wb") as f:
+            pickle.dump({"model": model, "scaler": scaler}, f)
+
+    manifest = {
+        "format": ARTIFACT_FORMAT,
+        "version": version,
+        "created_at": datetime.now().isoformat(),
+        "feature_cols": list(feature_cols),
+        "max_depth": compiled.max_depth,
+        "arrays": index,
+        "metrics": metrics or {}
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    _fsync_file(os.path.join(tmp_dir, "manifest.json"))
+
+    version_dir = os.path.join(artifact_dir, version)
+    try:
+        os.replace(tmp_dir, version_dir)
+    except OSError:
+        if not os.path.isdir(version_dir):
+            raise
+        # Same second and same arrays: that version already is this model
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    pointer_tmp = current_version_path(artifact_dir) + ".tmp"
+    with open(pointer_tmp, "w") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer_tmp, current_version_path(artifact_dir))
+
+    _prune_old_versions(artifact_dir, keep=version)
+    return version
+
+
+def _prune_old_versions(artifact_dir, keep):
+    versions = sorted(
+        d for d in os.listdir(artifact_dir)
+        if os.path.isdir(os.path.join(artifact_dir, d)) and not d.startswith(".")
+    )
+    old = [v for v in versions if v != keep]
+    for version in old[:max(0, len(old) - (KEEP_VERSIONS - 1))]:
+        shutil.rmtree(os.path.join(artifact_dir, version), ignore_errors=True)
+
+
+def load_artifact(version: str = None, artifact_dir: str = ARTIFACT_DIR):
+    """
+    Memory-map a model version (default: CURRENT).
+    Returns: (manifest, CompiledForest)
+    """
+    version = version or read_current_version(artifact_dir)
+    if version is None:
+        raise FileNotFoundError(f"No model artifact in {artifact_dir}")
+
+    version_dir = os.path.join(artifact_dir, version)
+    with open(os.path.join(version_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"Unsupported model artifact format: {manifest.get('format')}")
+
+    arrays = {
+        name: np.load(os.path.join(version_dir, entry["file"]), mmap_mode="r")
+        for name, entry in manifest["arrays"].items()
+    }
+    arrays["max_depth"] = manifest["max_depth"]
+    return manifest, CompiledForest(arrays)
+
+
+def load_estimator(version: str = None, artifact_dir: str = ARTIFACT_DIR):
+    """
+    sklearn (model, scaler) saved with a version, for tooling such as
+    benchmarks. Returns (None, None) if the version has no estimator.pkl.
+    """
+    version = version or read_current_version(artifact_dir)
+    if version is None:
+        return None, None
+    path = os.path.join(artifact_dir, version, "estimator.pkl")
+    if not os.path.exists(path):
+        return None, None
+    with open(path, "rb") as f:
+        estimator = pickle.load(f)
+    return estimator["model"], estimator["scaler"]
@@ -0,0 +1,181 @@
+"""
+Risk Model Registry
+Keeps the trained risk model artifacts loaded once per process and
+hot-swaps them when the files on disk change (e.g. after a retrain)
+
+Prefers the versioned, memory-mapped artifact (ai/model_artifact.py) and
+falls back to the legacy three-pickle layout when none has been written.
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, List, Optional
+
+from ai.compiled_forest import CompiledForest
+from ai.model_artifact import current_version_path, load_artifact, load_estimator, read_current_version
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """
+    Immutable snapshot of one consistent set of model artifacts.
+    model/scaler are None when served from a versioned artifact; large
+    batches get them through ModelRegistry.estimator().
+    """
+    model: Any
+    scaler: Any
+    feature_cols: List[str]
+    version: str
+    loaded_at: str
+    compiled: Optional[CompiledForest] = None
+
+
+class ModelRegistry:
+    """
+    Process-wide holder for the risk model.
+
+    - Artifacts are loaded once and reused by every prediction
+    - Each get() compares file mtimes/sizes (a few stat calls, no I/O)
+      and reloads only when they changed; for versioned artifacts only the
+      CURRENT pointer is checked
+    - The new snapshot replaces the old one in a single assignment, so
+      callers always see a matching model/scaler/feature_cols triple
+    """
+
+    def __init__(self, model_path: str, scaler_path: str, feature_cols_path: str,
+                 artifact_dir: Optional[str] = None):
+        self.paths = (model_path, scaler_path, feature_cols_path)
+        self.artifact_dir = artifact_dir
+        self._lock = threading.Lock()
+        self._current: Optional[LoadedModel] = None
+        self._signature = None
+        self._estimator_lock = threading.Lock()
+        self._estimator = (None, (None, None))  # (version, (model, scaler))
+
+    def _stat_signature(self):
+        """(mtime_ns, size) per artifact, or None if any file is missing"""
+        if self.artifact_dir:
+            try:
+                st = os.stat(current_version_path(self.artifact_dir))
+                return ('artifact', st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                pass
+
+        signature = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                return None
+            signature.append((st.st_mtime_ns, st.st_size))
+        return tuple(signature)
+
+    def _load(self, signature) -> LoadedModel:
+        if signature[0] == 'artifact':
+            manifest, compiled = load_artifact(read_current_version(self.artifact_dir),
+                                               self.artifact_dir)
+            return LoadedModel(
+                model=None,
+                scaler=None,
+                feature_cols=list(manifest['feature_cols']),
+                version=manifest['version'],
+                loaded_at=datetime.now().isoformat(),
+                compiled=compiled
+            )
+
+        digest = hashlib.sha256()
+        objects = []
+        for path in self.paths:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            digest.update(raw)
+            objects.append(pickle.loads(raw))
+
+        model, scaler, feature_cols = objects
+        return LoadedModel(
+            model=model,
+            scaler=scaler,
+            feature_cols=list(feature_cols),
+            version=digest.hexdigest()[:12],
+            loaded_at=datetime.now().isoformat(),
+            compiled=CompiledForest.from_sklearn(model, scaler)
+        )
+
+    def get(self) -> Optional[LoadedModel]:
+        """Return the current model snapshot, reloading if the files changed"""
+        signature = self._stat_signature()
+        if signature is not None and signature == self._signature:
+            return self._current
+
+        with self._lock:
+            # Another thread may have reloaded while we waited
+            if signature == self._signature:
+                return self._current
+
+            if signature is None:
+                # Keep serving the last good model while files are missing
+                # (e.g. mid-retrain); only report "not trained" if we never loaded
+                return self._current
+
+            try:
+                snapshot = self._load(signature)
+            except (OSError, EOFError, ValueError, KeyError, pickle.UnpicklingError) as e:
+                # A retrain may be halfway through writing the files
+                print(f"⚠️  Model reload failed, keeping version "
+                      f"{self._current.version if self._current else 'none'}: {e}")
+                return self._current
+
+            self._current = snapshot
+            self._signature = signature
+            print(f"✓ Risk model loaded (version {snapshot.version})")
+            return snapshot
+
+    def estimator(self, snapshot: LoadedModel):
+        """
+        sklearn (model, scaler) for a snapshot. For versioned artifacts the
+        estimator.pkl is unpickled on first use and kept for that version;
+        (None, None) if the version has none.
+        """
+        if snapshot.model is not None:
+            return snapshot.model, snapshot.scaler
+
+        with self._estimator_lock:
+            version, estimator = self._estimator
+            if version != snapshot.version:
+                estimator = load_estimator(snapshot.version, self.artifact_dir)
+                self._estimator = (snapshot.version, estimator)
+            return estimator
+
+    def invalidate(self):
+        """Force the next get() to reload from disk"""
+        with self._lock:
+            self._signature = None
+
+    def version_tag(self) -> str:
+        """
+        Cheap identifier of the model get() would serve (stat calls only,
+        never loads): the loaded version, or a marker that files changed.
+        """
+        signature = self._stat_signature()
+        if self._current is not None and signature in (None, self._signature):
+            return self._current.version
+        # sha, not hash(): str hashing is salted per process, and every
+        # worker must emit the same ETag for the same files
+        return f"pending-{hashlib.sha256(repr(signature).encode()).hexdigest()[:12]}"
+
+    def info(self) -> dict:
+        """Metadata about the loaded model (loads it if needed)"""
+        snapshot = self.get()
+        if snapshot is None:
+            return {'loaded': False}
+        return {
+            'loaded': True,
+            'version': snapshot.version,
+            'loaded_at': snapshot.loaded_at,
+            'n_features': len(snapshot.feature_cols),
+            'feature_cols': snapshot.feature_cols
+        }
@@ -4,7 +4,7 @@ from langchain_core.messages import HumanMessage
 from ai.llm_client import LocalChatOllama as ChatOpenAI
 from app.vector.chroma_store import search_documents
 from ai.risk_model import predict_patient_risk
-from database.db import get_connection
+from database.db import get_read_connection
 from ai.state import AgentState
 from ai.prompts import INTENT_CAT_PROMPT, LIGHTWEIGHT_RAG_PROMPT, FINAL_SYNTHESIS_PROMPT, GENERAL_KNOWLEDGE_PROMPT, OUT_OF_SCOPE_PROMPT
 from app.services.context_service import truncate_patient_history
@@ -108,7 +108,7 @@ def retrieve_knowledge(state: AgentState):
 def execute_aggregation(state: AgentState):
     """Aggregator Node for SQL queries."""
     entities = state['entities']
-    conn = get_connection()
+    conn = get_read_connection()
     cur = conn.cursor()
     
     status = entities.get("status", "").upper()
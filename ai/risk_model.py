@@ -5,25 +5,80 @@ Trains a machine learning model to predict patient risk based on lab values
 
 import pandas as pd
 import numpy as np
-import pickle
 import os
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
-from database.db import get_connection as get_db
+from database.db import get_read_connection as get_db
 from datetime import datetime
+from ai.model_registry import ModelRegistry
+from ai.compiled_forest import CompiledForest
+from ai.model_artifact import ARTIFACT_DIR, save_artifact
+from ai.feature_store import STATUS_RISK, feature_base, feature_name, get_feature_store
+from database.repository import get_lab_aggregates
 
 
+# Legacy three-pickle layout, still served when no versioned artifact exists
 MODEL_PATH = "ai/models/risk_model.pkl"
 SCALER_PATH = "ai/models/scaler.pkl"
+FEATURE_COLS_PATH = "ai/models/feature_cols.pkl"
 MODELS_DIR = "ai/models"
 
+# Loaded once per process, reloaded only when the files above change
+model_registry = ModelRegistry(MODEL_PATH, SCALER_PATH, FEATURE_COLS_PATH,
+                               artifact_dir=ARTIFACT_DIR)
+
 
 def ensure_models_dir():
     """Create models directory if it doesn't exist"""
     os.makedirs(MODELS_DIR, exist_ok=True)
 
 
+def build_training_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Vectorized per-patient pivot of raw lab rows.
+
+    df: one row per lab result with subject_id, test_name, value, status,
+        in table (id) order
+    Returns: one row per patient - subject_id, one '{test}_value' column per
+             test (latest value wins) and risk_level (max status).
+    Patients and feature columns keep their order of first appearance.
+    """
+    # Patient index in order of first appearance
+    subject_codes, subject_ids = pd.factorize(df['subject_id'])
+
+    # Visit rows patient by patient (stable, so id order is kept within a
+    # patient) - this fixes the feature column order
+    order = np.argsort(subject_codes, kind='stable')
+    subject_codes = subject_codes[order]
+
+    # Normalize each distinct test name once, then map per row
+    test_codes, test_names = pd.factorize(df['test_name'].to_numpy()[order])
+    feature_codes, feature_cols = pd.factorize(
+        np.array([feature_name(t) for t in test_names], dtype=object)[test_codes]
+    )
+
+    # Latest value of each (patient, feature) pair
+    cells = pd.DataFrame({
+        'row': subject_codes,
+        'col': feature_codes,
+        'value': df['value'].to_numpy(dtype=np.float64)[order]
+    }).drop_duplicates(subset=['row', 'col'], keep='last')
+
+    values = np.full((len(subject_ids), len(feature_cols)), np.nan)
+    values[cells['row'].to_numpy(), cells['col'].to_numpy()] = cells['value'].to_numpy()
+
+    # Max status per patient
+    status_risk = df['status'].map(STATUS_RISK).fillna(0).to_numpy(dtype=np.int64)
+    risk_level = np.zeros(len(subject_ids), dtype=np.int64)
+    np.maximum.at(risk_level, pd.factorize(df['subject_id'])[0], status_risk)
+
+    training_df = pd.DataFrame(values, columns=list(feature_cols))
+    training_df.insert(0, 'subject_id', subject_ids)
+    training_df['risk_level'] = risk_level
+    return training_df
+
+
 def prepare_training_data():
     """
     Fetch lab data from database and prepare features for model training
@@ -53,37 +108,215 @@ def prepare_training_data():
     df = pd.DataFrame([dict(r) for r in records])
 
     # Pivot to get features per patient
-    pivot_data = []
+    training_df = build_training_frame(df)
+
+    # Fill missing values with median
+    feature_cols = [col for col in training_df.columns
+                    if col not in ['subject_id', 'risk_level']]
+    training_df[feature_cols] = training_df[feature_cols].fillna(
+        training_df[feature_cols].median()
+    )
+
+    # Remove rows with missing values
+    training_df = training_df.dropna()
+
+    if len(training_df) < 2:
+        raise ValueError("Insufficient training data after preprocessing")
+
+    # Prepare X and y
+    X = training_df[feature_cols].values
+    y = training_df['risk_level'].values
+
+    return X, y, feature_cols, training_df
+
+
+# Rows fetched per cursor round-trip by the streaming training builder
+TRAINING_CHUNK_SIZE = 100000
+
+
+def prepare_training_data_streaming(chunk_size: int = TRAINING_CHUNK_SIZE, out_path: str = None):
+    """
+    Out-of-core variant of prepare_training_data for lab tables larger than RAM.
+
+    Rows are read in subject_id order with fetchmany(chunk_size) and written
+    straight into a preallocated (patients x features) float32 matrix, so at most
+    one chunk of raw rows is alive at a time. With out_path the matrix is a
+    memory-mapped .npy file instead of an in-memory array.
+
+    Patients are ordered by subject_id and feature columns alphabetically;
+    values (latest row per test wins), labels and median filling follow
+    prepare_training_data.
+    Returns: (X, y, feature_cols, subject_ids)
+    """
+    conn = get_db()
+    cur = conn.cursor()
+
+    # Pin the row range so concurrent inserts can't outgrow the preallocation
+    cur.execute("SELECT COALESCE(MAX(id), 0) AS max_id FROM lab_interpretations")
+    max_id = cur.fetchone()['max_id']
+
+    # Size the output before streaming (index scans, nothing materialized)
+    cur.execute("""
+        SELECT COUNT(DISTINCT subject_id) AS n
+        FROM lab_interpretations
+        WHERE value IS NOT NULL AND status IS NOT NULL AND id <= ?
+    """, (max_id,))
+    n_patients = cur.fetchone()['n']
+
+    if not n_patients:
+        conn.close()
+        raise ValueError("No training data available in database")
+
+    cur.execute("""
+        SELECT DISTINCT test_name
+        FROM lab_interpretations
+        WHERE value IS NOT NULL AND status IS NOT NULL AND id <= ?
+    """, (max_id,))
+    test_to_feature = {r['test_name']: feature_name(r['test_name']) for r in cur.fetchall()}
+    feature_cols = sorted(set(test_to_feature.values()))
+    col_index = {col: i for i, col in enumerate(feature_cols)}
+    test_cols = {t: col_index[f] for t, f in test_to_feature.items()}
+
+    shape = (n_patients, len(feature_cols))
+    if out_path:
+        X = np.lib.format.open_memmap(out_path, mode='w+', dtype=np.float32, shape=shape)
+        X[:] = np.nan
+    else:
+        X = np.full(shape, np.nan, dtype=np.float32)
+    y = np.zeros(n_patients, dtype=np.int64)
+    subject_ids = np.zeros(n_patients, dtype=np.int64)
+
+    cur.execute("""
+        SELECT subject_id, test_name, value, status
+        FROM lab_interpretations
+        WHERE value IS NOT NULL AND status IS NOT NULL AND id <= ?
+        ORDER BY subject_id, id
+    """, (max_id,))
+
+    row = -1
+    last_subject = None
+    while True:
+        chunk = cur.fetchmany(chunk_size)
+        if not chunk:
+            break
+
+        subjects = np.fromiter((r[0] for r in chunk), dtype=np.int64, count=len(chunk))
+        cols = np.fromiter((test_cols[r[1]] for r in chunk), dtype=np.int64, count=len(chunk))
+        values = np.fromiter((r[2] for r in chunk), dtype=np.float64, count=len(chunk))
+        risks = np.fromiter((STATUS_RISK.get(r[3], 0) for r in chunk), dtype=np.int64, count=len(chunk))
+        del chunk
+
+        # Matrix row per lab row: advances whenever subject_id changes,
+        # continuing across chunk boundaries
+        starts = np.empty(len(subjects), dtype=bool)
+        starts[0] = subjects[0] != last_subject
+        starts[1:] = subjects[1:] != subjects[:-1]
+        rows = row + np.cumsum(starts)
+        subject_ids[rows[starts]] = subjects[starts]
+        row, last_subject = rows[-1], subjects[-1]
+
+        # Latest value per (patient, feature) within the chunk; later chunks
+        # overwrite earlier ones, matching id order
+        cells = rows * len(feature_cols) + cols
+        _, last_rev = np.unique(cells[::-1], return_index=True)
+        last = len(cells) - 1 - last_rev
+        X[rows[last], cols[last]] = values[last]
+
+        np.maximum.at(y, rows, risks)
+
+    conn.close()
+
+    # Fill missing values with median, one column at a time
+    for j in range(len(feature_cols)):
+        column = X[:, j]
+        missing = np.isnan(column)
+        if missing.any() and not missing.all():
+            column[missing] = np.nanmedian(column)
+
+    # Remove rows with missing values (only possible for all-empty features)
+    complete = ~np.isnan(X).any(axis=1)
+    if not complete.all():
+        X, y, subject_ids = X[complete], y[complete], subject_ids[complete]
+
+    if len(X) < 2:
+        raise ValueError("Insufficient training data after preprocessing")
+
+    return X, y, feature_cols, subject_ids
+
+
+def prepare_training_data_from_store():
+    """
+    Training data sliced from the per-patient feature store (no raw row scan).
+    Labels are each patient's max status over rows with a value.
+    Returns: (X, y, feature_cols, subject_ids)
+    """
+    store = get_feature_store()
+    store.sync()
+    X, y, feature_cols, subject_ids = store.training_slice()
+
+    if len(X) == 0:
+        raise ValueError("No training data available in database")
+
+    # Fill missing values with median
+    X = X.astype(np.float64)
+    for j in range(X.shape[1]):
+        missing = np.isnan(X[:, j])
+        if missing.any() and not missing.all():
+            X[missing, j] = np.nanmedian(X[:, j])
+
+    # Remove rows with missing values
+    complete = ~np.isnan(X).any(axis=1)
+    X, y, subject_ids = X[complete], y[complete], subject_ids[complete]
+
+    if len(X) < 2:
+        raise ValueError("Insufficient training data after preprocessing")
+
+    return X, y, feature_cols, subject_ids
 
-    for subject_id in df['subject_id'].unique():
-        patient_data = df[df['subject_id'] == subject_id]
 
-        # Get patient features
-        features = {'subject_id': subject_id}
+# Rolling-aggregate features '{test}_{stat}' -> lab_aggregates column.
+# They sit next to the latest-value feature '{test}_value'.
+AGGREGATE_STATS = {
+    'min': 'min_value',
+    'max': 'max_value',
+    'mean': 'mean_value',
+    'count': 'value_count',
+    'change': 'last_change'
+}
 
-        # Add lab test values as features
-        for _, row in patient_data.iterrows():
-            test_name = row['test_name'].lower().replace(' ', '_').replace('-', '_')
-            features[f'{test_name}_value'] = row['value']
 
-        # Determine risk label from status
-        # CRITICAL = 2, ABNORMAL = 1, NORMAL = 0
-        max_risk = 0
-        if 'CRITICAL' in patient_data['status'].values:
-            max_risk = 2
-        elif 'ABNORMAL' in patient_data['status'].values:
-            max_risk = 1
+def prepare_training_data_from_aggregates():
+    """
+    Training data from the incrementally maintained lab_aggregates table:
+    per test the latest value plus min / max / mean / count / last change.
+    Reads O(patients x tests) rows instead of the raw lab history.
+    Returns: (X, y, feature_cols, subject_ids)
+    """
+    rows = get_lab_aggregates()
+    if not rows:
+        raise ValueError("No training data available in database")
 
-        features['risk_level'] = max_risk
-        pivot_data.append(features)
+    df = pd.DataFrame([dict(r) for r in rows])
+    bases = {t: feature_base(t) for t in df['test_name'].unique()}
+    df['base'] = df['test_name'].map(bases)
+
+    stat_columns = {'value': 'last_value', **AGGREGATE_STATS}
+    wide = df.pivot_table(
+        index='subject_id', columns='base',
+        values=list(stat_columns.values()), aggfunc='last'
+    )
 
-    training_df = pd.DataFrame(pivot_data)
+    feature_cols, columns = [], []
+    for base in sorted(set(bases.values())):
+        for stat, column in stat_columns.items():
+            if (column, base) in wide.columns:
+                feature_cols.append(f"{base}_{stat}")
+                columns.append(wide[(column, base)])
+    training_df = pd.concat(columns, axis=1, keys=feature_cols).astype(np.float64)
 
     # Fill missing values with median
-    numeric_cols = training_df.select_dtypes(include=[np.number]).columns
-    for col in numeric_cols:
-        if col != 'subject_id' and col != 'risk_level':
-            training_df[col].fillna(training_df[col].median(), inplace=True)
+    training_df = training_df.fillna(training_df.median())
+    training_df['risk_level'] = df.groupby('subject_id')['max_risk_level'].max()
 
     # Remove rows with missing values
     training_df = training_df.dropna()
@@ -91,24 +324,31 @@ def prepare_training_data():
     if len(training_df) < 2:
         raise ValueError("Insufficient training data after preprocessing")
 
-    # Prepare X and y
-    feature_cols = [col for col in training_df.columns
-                    if col not in ['subject_id', 'risk_level']]
     X = training_df[feature_cols].values
-    y = training_df['risk_level'].values
-
-    return X, y, feature_cols, training_df
+    y = training_df['risk_level'].values.astype(np.int64)
+    return X, y, feature_cols, training_df.index.values
 
 
-def train_risk_model():
+def train_risk_model(source: str = "table"):
     """
     Train the risk prediction model
+    source: 'table'      - pivot lab_interpretations in memory (default)
+            'streaming'  - prepare_training_data_streaming, bounded memory
+            'store'      - slice the per-patient feature store
+            'aggregates' - latest value + rolling aggregates per test
     """
     ensure_models_dir()
 
     print("📊 Preparing training data...")
     try:
-        X, y, feature_cols, training_df = prepare_training_data()
+        if source == "streaming":
+            X, y, feature_cols, _ = prepare_training_data_streaming()
+        elif source == "store":
+            X, y, feature_cols, _ = prepare_training_data_from_store()
+        elif source == "aggregates":
+            X, y, feature_cols, _ = prepare_training_data_from_aggregates()
+        else:
+            X, y, feature_cols, training_df = prepare_training_data()
     except ValueError as e:
         print(f"❌ Error: {e}")
         return False
@@ -152,102 +392,71 @@ def train_risk_model():
     print(f"✓ Training accuracy: {train_score:.2%}")
     print(f"✓ Testing accuracy: {test_score:.2%}")
 
-    # Save model and scaler
-    with open(MODEL_PATH, 'wb') as f:
-        pickle.dump(model, f)
-
-    with open(SCALER_PATH, 'wb') as f:
-        pickle.dump(scaler, f)
+    # Save one versioned artifact (compiled forest + feature names), atomically
+    version = save_artifact(
+        CompiledForest.from_sklearn(model, scaler),
+        feature_cols,
+        model=model,
+        scaler=scaler,
+        metrics={
+            'train_accuracy': round(float(train_score), 4),
+            'test_accuracy': round(float(test_score), 4),
+            'n_samples': int(len(X))
+        }
+    )
 
-    # Save feature names for later use
-    with open('ai/models/feature_cols.pkl', 'wb') as f:
-        pickle.dump(feature_cols, f)
+    print(f"✓ Model version {version} saved to {ARTIFACT_DIR}")
 
-    print(f"✓ Model saved to {MODEL_PATH}")
-    print(f"✓ Scaler saved to {SCALER_PATH}")
+    # Pick up the new artifacts on the next prediction in this process
+    model_registry.invalidate()
 
     return True
 
 
 def load_model():
-    """Load trained model and scaler"""
-    if not os.path.exists(MODEL_PATH) or not os.path.exists(SCALER_PATH):
+    """
+    Return the trained sklearn model, scaler and feature names.
+    For versioned artifacts they are unpickled on first use.
+    """
+    snapshot = model_registry.get()
+    if snapshot is None:
         return None, None, None
 
-    with open(MODEL_PATH, 'rb') as f:
-        model = pickle.load(f)
+    model, scaler = model_registry.estimator(snapshot)
+    return model, scaler, snapshot.feature_cols
 
-    with open(SCALER_PATH, 'rb') as f:
-        scaler = pickle.load(f)
 
-    with open('ai/models/feature_cols.pkl', 'rb') as f:
-        feature_cols = pickle.load(f)
+# Batches up to this size are scored with the compiled forest
+COMPILED_BATCH_LIMIT = 256
 
-    return model, scaler, feature_cols
 
-
-def predict_patient_risk(subject_id: int):
+def export_compiled_model(model=None, scaler=None):
     """
-    Predict risk score for a patient
-    Returns: {
-        'subject_id': int,
-        'risk_level': 0-2,
-        'risk_label': 'NORMAL' | 'ABNORMAL' | 'CRITICAL',
-        'confidence': float (0-100),
-        'predicted_at': str
-    }
+    Flatten a trained forest and its scaler into contiguous NumPy arrays.
+    Defaults to the currently loaded model.
+    Returns: CompiledForest (pure-NumPy evaluator), or None if no model is trained
     """
-    model, scaler, feature_cols = load_model()
-
-    if model is None:
-        return {
-            'subject_id': subject_id,
-            'error': 'Model not trained. Please train the model first.'
-        }
-
-    # Fetch patient's lab data
-    conn = get_db()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT test_name, value
-        FROM lab_interpretations
-        WHERE subject_id = ? AND value IS NOT NULL
-    """, (subject_id,))
-
-    records = cur.fetchall()
-    conn.close()
+    if model is None or scaler is None:
+        snapshot = model_registry.get()
+        return snapshot.compiled if snapshot is not None else None
+    return CompiledForest.from_sklearn(model, scaler)
 
-    if not records:
-        return {
-            'subject_id': subject_id,
-            'error': 'No lab data found for this patient'
-        }
 
-    # Prepare features for prediction
-    patient_features = {}
-    for record in records:
-        test_name = record['test_name'].lower().replace(' ', '_').replace('-', '_')
-        patient_features[f'{test_name}_value'] = record['value']
+def get_model_info():
+    """Version and feature metadata of the currently loaded model"""
+    return model_registry.info()
 
-    # Create feature vector matching model's expected features
-    X = []
-    for col in feature_cols:
-        X.append(patient_features.get(col, 0.0))  # Use 0 for missing features
 
-    X = np.array([X])
+RISK_LABELS = ['NORMAL', 'ABNORMAL', 'CRITICAL']
 
-    # Scale and predict
-    X_scaled = scaler.transform(X)
-    risk_level = model.predict(X_scaled)[0]
-    probabilities = model.predict_proba(X_scaled)[0]
-    
+def _format_prediction(subject_id, probabilities, classes, predicted_at, version):
+    """Build the API response for one row of predict_proba output"""
     # Handle case where model has fewer than 3 classes
     # Create proper probability mapping for all 3 classes
     prob_dict = {}
-    for class_idx, class_label in enumerate(model.classes_):
+    for class_idx, class_label in enumerate(classes):
         prob_dict[class_label] = probabilities[class_idx]
-    
+
     # Ensure all 3 classes have a probability (0 if not present)
     full_probabilities = [
         prob_dict.get(0, 0.0),  # NORMAL
@@ -255,23 +464,19 @@ def predict_patient_risk(subject_id: int):
         prob_dict.get(2, 0.0)   # CRITICAL
     ]
 
-    # Map risk level to label
-    risk_labels = ['NORMAL', 'ABNORMAL', 'CRITICAL']
-    risk_label = risk_labels[int(risk_level)]
+    # Same rule as RandomForestClassifier.predict: most probable class
+    risk_level = int(classes[int(np.argmax(probabilities))])
 
     # Get confidence (probability of predicted class)
     confidence = float(max(probabilities)) * 100
 
-    # Pad probabilities to always have 3 elements (normal, abnormal, critical)
-    padded_probs = list(probabilities) + [0.0] * (3 - len(probabilities))
-    padded_probs = padded_probs[:3]  # Ensure exactly 3 elements
-
     return {
         'subject_id': subject_id,
-        'risk_level': int(risk_level),
-        'risk_label': risk_label,
+        'risk_level': risk_level,
+        'risk_label': RISK_LABELS[risk_level],
         'confidence': round(confidence, 2),
-        'predicted_at': datetime.now().isoformat(),
+        'predicted_at': predicted_at,
+        'model_version': version,
         'probabilities': {
             'normal': round(float(full_probabilities[0]) * 100, 2),
             'abnormal': round(float(full_probabilities[1]) * 100, 2),
@@ -280,5 +485,108 @@ def predict_patient_risk(subject_id: int):
     }
 
 
+def build_feature_matrix(subject_ids, feature_cols):
+    """
+    Model input matrix for many patients, read from the feature store.
+
+    subject_ids: list of subject ids, or None for every stored patient
+    Returns: (subject_ids, X) where X[i] holds the features of subject_ids[i].
+             Patients without any lab values are left out.
+    The store holds the latest value of each test; rolling-aggregate
+    features come from lab_aggregates. Tests the model doesn't know are
+    ignored and missing features are 0.
+    """
+    store = get_feature_store()
+    store.sync()
+
+    if subject_ids is None:
+        subject_ids = store.subject_ids()
+    else:
+        subject_ids = list(dict.fromkeys(int(s) for s in subject_ids))
+
+    found, X = store.lookup(subject_ids, feature_cols, fill_value=0.0)
+    _fill_aggregate_features(found, X, feature_cols)
+    return found, X
+
+
+def _fill_aggregate_features(subject_ids, X, feature_cols):
+    """Fill '{test}_{stat}' columns in place from lab_aggregates (one query)"""
+    agg_cols = {
+        col: j for j, col in enumerate(feature_cols)
+        if col.rsplit('_', 1)[-1] in AGGREGATE_STATS
+    }
+    if not agg_cols or not subject_ids:
+        return
+
+    row_of = {s: i for i, s in enumerate(subject_ids)}
+    for r in get_lab_aggregates(subject_ids):
+        base = feature_base(r['test_name'])
+        for stat, column in AGGREGATE_STATS.items():
+            j = agg_cols.get(f"{base}_{stat}")
+            if j is not None and r[column] is not None:
+                X[row_of[r['subject_id']], j] = r[column]
+
+
+def predict_patient_risk_batch(subject_ids=None):
+    """
+    Predict risk for many patients in one pass:
+    one feature store lookup, one feature matrix and one compiled-forest pass.
+
+    subject_ids: iterable of subject ids, or None to score every patient
+    Returns: list of prediction dicts (same shape as predict_patient_risk),
+             in input order; patients without lab data get an 'error' entry
+    """
+    snapshot = model_registry.get()
+    requested = None if subject_ids is None else list(subject_ids)
+
+    if snapshot is None:
+        return [
+            {'subject_id': s, 'error': 'Model not trained. Please train the model first.'}
+            for s in (requested or [])
+        ]
+
+    scored_ids, X = build_feature_matrix(requested, snapshot.feature_cols)
+
+    results = {}
+    if scored_ids:
+        # Large batches amortize sklearn's validation / joblib overhead and use
+        # its threads; for artifacts the estimator is unpickled on first use
+        model, scaler = ((None, None) if len(X) <= COMPILED_BATCH_LIMIT
+                         else model_registry.estimator(snapshot))
+        if model is None:
+            # Flat-array forest: same output as scaler.transform + predict_proba
+            probabilities = snapshot.compiled.predict_proba(X)
+        else:
+            probabilities = model.predict_proba(scaler.transform(X))
+        classes = snapshot.compiled.classes
+        predicted_at = datetime.now().isoformat()
+        for subject_id, probs in zip(scored_ids, probabilities):
+            results[subject_id] = _format_prediction(
+                subject_id, probs, classes, predicted_at, snapshot.version
+            )
+
+    if requested is None:
+        return list(results.values())
+
+    return [
+        results.get(int(s)) or {'subject_id': s, 'error': 'No lab data found for this patient'}
+        for s in requested
+    ]
+
+
+def predict_patient_risk(subject_id: int):
+    """
+    Predict risk score for a patient
+    Returns: {
+        'subject_id': int,
+        'risk_level': 0-2,
+        'risk_label': 'NORMAL' | 'ABNORMAL' | 'CRITICAL',
+        'confidence': float (0-100),
+        'predicted_at': str
+    }
+    """
+    return predict_patient_risk_batch([subject_id])[0]
+
+
 if __name__ == '__main__':
     train_risk_model()
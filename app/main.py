@@ -10,7 +10,7 @@ import json
 from typing import List, Dict, Any, Optional
 
 from fastapi import FastAPI, Request, BackgroundTasks, HTTPException, Depends, status
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
@@ -31,13 +31,23 @@ from app.services.report_service import (
     report_high_risk_patients,
     unreviewed_critical_summary,
     recent_critical_activity,
+    patient_lab_aggregates,
+    report_dashboard,
+    review_critical_alerts,
+    critical_activity_histogram,
 )
 from app.services.risk_service import (
     get_patient_risk_score,
     get_high_risk_patients,
     get_risk_distribution,
+    get_loaded_model_info,
 )
-from database.db import get_connection
+from app.services.risk_score_service import start_rescoring_worker
+from app.services.dashboard_stream import dashboard_broadcaster
+from app.services.http_cache import NotModified, data_version_etag
+from ai.inference_pool import InferenceBusyError, run_inference, shutdown_inference_pool
+from database.async_db import fetch_one, run_db, shutdown_db_pool
+from database.models import create_tables
 
 # AI imports are now mostly in services and chat_handler
 
@@ -52,6 +62,38 @@ app = FastAPI(
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
 
+
+@app.on_event("startup")
+async def on_startup():
+    """Ensure derived tables exist and keep materialized risk scores current."""
+    create_tables()
+    start_rescoring_worker()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    shutdown_inference_pool()
+    shutdown_db_pool()
+
+
+@app.exception_handler(NotModified)
+async def not_modified_handler(request: Request, exc: NotModified):
+    """If-None-Match hit: the client's copy is current, send no body."""
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": exc.etag, "Cache-Control": "private, no-cache"},
+    )
+
+
+@app.exception_handler(InferenceBusyError)
+async def inference_busy_handler(request: Request, exc: InferenceBusyError):
+    """Inference pool saturated: ask the client to retry instead of queueing forever."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "2"},
+    )
+
 # =====================================================
 # DASHBOARD ROUTES
 # =====================================================
@@ -68,11 +110,7 @@ async def read_root(request: Request):
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     print(f"DEBUG: Login attempt for user: '{form_data.username}' (len: {len(form_data.username)})")
     print(f"DEBUG: Password length received: {len(form_data.password)}")
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE username = ?", (form_data.username.strip(),))
-    user = cur.fetchone()
-    conn.close()
+    user = await fetch_one("SELECT * FROM users WHERE username = ?", (form_data.username.strip(),))
     
     if not user:
         print(f"DEBUG: User '{form_data.username}' not found in DB")
@@ -167,51 +205,145 @@ class ChatRequest(BaseModel):
     question: str = Field(..., min_length=1, description="User question")
 
 
+class AlertReviewRequest(BaseModel):
+    ids: Optional[List[int]] = Field(None, description="Lab result ids to acknowledge")
+    subject_id: Optional[int] = Field(None, description="Acknowledge all of this patient's alerts")
+    test_name: Optional[str] = Field(None, description="Only alerts for this test")
+    processed_before: Optional[str] = Field(None, description="Only alerts processed at or before this time")
+
+
 
 
 # ==============================================================================
 # REPORTING APIs (DASHBOARD INSIGHTS)
 # ==============================================================================
+# GET reports carry an ETag from the data version and answer 304 when the
+# client's If-None-Match is still current.
+
+REPORT_ETAG = [Depends(data_version_etag())]
+CLOCK_REPORT_ETAG = [Depends(data_version_etag(time_bucket_seconds=60))]
+
+@app.get("/reports/dashboard", dependencies=REPORT_ETAG)
+async def reports_dashboard(current_user: Any = Depends(get_current_user)):
+    """All /dashboard panels in one response (one connection, rollup-backed)."""
+    return await run_db(report_dashboard)
+
 
-@app.get("/reports/summary")
+@app.get("/reports/summary", dependencies=REPORT_ETAG)
 async def reports_summary(current_user: Any = Depends(get_current_user)):
     """Returns a categorical count of all lab results (NORMAL, ABNORMAL, etc.)."""
-    return report_summary()
+    return await run_db(report_summary)
 
 
-@app.get("/reports/patient-risk-distribution")
+@app.get("/reports/patient-risk-distribution", dependencies=REPORT_ETAG)
 async def reports_patient_risk_dist(current_user: Any = Depends(get_current_user)):
-    return report_patient_risk_distribution()
+    return await run_db(report_patient_risk_distribution)
 
 
-@app.get("/reports/high-risk-patients")
+@app.get("/reports/high-risk-patients", dependencies=REPORT_ETAG)
 async def reports_high_risk(current_user: Any = Depends(get_current_user)):
-    return report_high_risk_patients()
+    return await run_db(report_high_risk_patients)
 
 
-@app.get("/reports/by-lab")
+@app.get("/reports/by-lab", dependencies=REPORT_ETAG)
 async def reports_by_lab(current_user: Any = Depends(get_current_user)):
-    return report_by_lab()
+    return await run_db(report_by_lab)
 
 
-@app.get("/reports/by-gender")
+@app.get("/reports/by-gender", dependencies=REPORT_ETAG)
 async def reports_by_gender(current_user: Any = Depends(get_current_user)):
-    return report_by_gender()
+    return await run_db(report_by_gender)
+
+
+@app.get("/reports/unreviewed-critical", dependencies=REPORT_ETAG)
+async def reports_unreviewed_critical(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    columns: Optional[str] = None,
+    test_name: Optional[str] = None,
+    subject_id: Optional[int] = None,
+    current_user: Any = Depends(get_current_user),
+):
+    """
+    Unreviewed CRITICAL labs, newest first, one keyset page at a time.
+    Pass the returned next_cursor back as ?cursor= for the following page;
+    columns is a comma-separated projection (e.g. id,subject_id,test_name,value).
+    """
+    try:
+        return await run_db(
+            unreviewed_critical,
+            limit=limit,
+            cursor=cursor,
+            columns=columns.split(",") if columns else None,
+            test_name=test_name,
+            subject_id=subject_id,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.get("/reports/unreviewed-critical")
-async def reports_unreviewed_critical(current_user: Any = Depends(get_current_user)):
-    return unreviewed_critical()
+@app.post("/reports/unreviewed-critical/review")
+async def reports_review_critical(payload: AlertReviewRequest, current_user: Any = Depends(get_current_user)):
+    """
+    Acknowledge critical alerts in bulk (by ids, subject and/or filter) in one
+    transaction. Returns how many were marked and the new unreviewed counts.
+    """
+    try:
+        return await run_db(
+            review_critical_alerts,
+            ids=payload.ids,
+            subject_id=payload.subject_id,
+            test_name=payload.test_name,
+            processed_before=payload.processed_before,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.get("/reports/unreviewed-critical-summary")
+@app.get("/reports/unreviewed-critical-summary", dependencies=REPORT_ETAG)
 async def reports_unreviewed_summary(current_user: Any = Depends(get_current_user)):
-    return unreviewed_critical_summary()
+    return await run_db(unreviewed_critical_summary)
 
 
-@app.get("/reports/recent-critical")
+@app.get("/reports/recent-critical", dependencies=CLOCK_REPORT_ETAG)
 async def reports_recent_critical(current_user: Any = Depends(get_current_user)):
-    return recent_critical_activity()
+    return await run_db(recent_critical_activity)
+
+
+@app.get("/reports/stream")
+async def reports_stream(current_user: Any = Depends(get_current_user)):
+    """
+    Server-Sent Events: ML dashboard aggregates (risk distribution,
+    unreviewed critical summary, high-risk count), pushed when data changes.
+    """
+    return StreamingResponse(
+        dashboard_broadcaster.subscribe(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/reports/activity-histogram", dependencies=CLOCK_REPORT_ETAG)
+async def reports_activity_histogram(
+    bucket: str = "hour",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    current_user: Any = Depends(get_current_user),
+):
+    """
+    CRITICAL/ABNORMAL counts per hour or day (UTC) between start and end
+    (ISO datetimes or epoch seconds; defaults to the last 24h / 30 days).
+    """
+    try:
+        return await run_db(critical_activity_histogram, bucket, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/patients/{subject_id}/lab-aggregates")
+async def patient_lab_aggregates_view(subject_id: int, current_user: Any = Depends(get_current_user)):
+    """Per-test running aggregates for one patient (no scan over the lab history)."""
+    return await run_db(patient_lab_aggregates, subject_id)
 
 
 # =====================================================
@@ -224,15 +356,18 @@ async def predict_patient_risk_score(subject_id: int, current_user: Any = Depend
     Predict risk score for a specific patient using trained ML model
     Returns: risk_level (0-2), risk_label, confidence, probabilities
     """
-    return get_patient_risk_score(subject_id)
+    return await run_inference(get_patient_risk_score, subject_id)
 
 
-@app.get("/predict/risk-distribution")
+@app.get(
+    "/predict/risk-distribution",
+    dependencies=[Depends(data_version_etag(include_model=True))],
+)
 async def predict_risk_distribution(current_user: Any = Depends(get_current_user)):
     """
     Get distribution of patients across risk levels
     """
-    return get_risk_distribution()
+    return await run_db(get_risk_distribution)
 
 
 @app.get("/predict/high-risk")
@@ -241,7 +376,16 @@ async def predict_high_risk_patients(risk_level: int = 2, limit: int = 50, curre
     Get patients with high risk scores
     risk_level: 1 = ABNORMAL or higher, 2 = CRITICAL only
     """
-    return get_high_risk_patients(risk_level, limit)
+    return await run_db(get_high_risk_patients, risk_level, limit)
+
+
+@app.get("/predict/model")
+async def predict_model_info(current_user: Any = Depends(get_current_user)):
+    """
+    Version and feature list of the loaded risk model
+    (may load it from disk, so off the event loop)
+    """
+    return await run_db(get_loaded_model_info)
 
 
 
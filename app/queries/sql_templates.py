@@ -10,28 +10,28 @@ All queries use parameterized placeholders (?) for safety.
 COUNT_TEMPLATES = {
     # Count all labs for a patient
     "all_labs": {
-        "sql": "SELECT COUNT(*) FROM lab_interpretations WHERE subject_id = ?",
+        "sql": "SELECT COUNT(*) AS count FROM lab_interpretations WHERE subject_id = ?",
         "params": ["subject_id"],
         "description": "Count all laboratory results for a patient"
     },
     
     # Count by status
     "by_status": {
-        "sql": "SELECT COUNT(*) FROM lab_interpretations WHERE subject_id = ? AND status = ?",
+        "sql": "SELECT COUNT(*) AS count FROM lab_interpretations WHERE subject_id = ? AND status = ?",
         "params": ["subject_id", "status"],
         "description": "Count labs by status (NORMAL/ABNORMAL/CRITICAL)"
     },
     
     # Count by test name
     "by_test": {
-        "sql": "SELECT COUNT(*) FROM lab_interpretations WHERE subject_id = ? AND test_name = ?",
+        "sql": "SELECT COUNT(*) AS count FROM lab_interpretations WHERE subject_id = ? AND test_name = ?",
         "params": ["subject_id", "test_name"],
         "description": "Count specific test results for a patient"
     },
     
     # Count by status and test
     "by_status_and_test": {
-        "sql": "SELECT COUNT(*) FROM lab_interpretations WHERE subject_id = ? AND status = ? AND test_name = ?",
+        "sql": "SELECT COUNT(*) AS count FROM lab_interpretations WHERE subject_id = ? AND status = ? AND test_name = ?",
         "params": ["subject_id", "status", "test_name"],
         "description": "Count specific test results with status filter"
     },
@@ -7,7 +7,7 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, HTTPException, status
-from database.db import get_connection
+from database.async_db import fetch_one
 
 # --- Configuration ---
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-for-development")
@@ -59,14 +59,10 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         print(f"AUTH_DEBUG: JWT Decode Error: {e}")
         raise credentials_exception
         
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE username = ?", (username,))
-    user = cur.fetchone()
-    conn.close()
+    user = await fetch_one("SELECT * FROM users WHERE username = ?", (username,))
     
     if user is None:
         print(f"AUTH_DEBUG: User {username} not found in DB during token validation")
         raise credentials_exception
     print(f"AUTH_DEBUG: get_current_user success for {username}")
-    return dict(user)
+    return user
@@ -1,5 +1,6 @@
 # app/services/chat_handler.py
 
+import asyncio
 import json
 import re
 from fastapi.responses import StreamingResponse
@@ -9,10 +10,11 @@ from ai.agent import app as agent_app
 from ai.llm_client import LocalChatOllama as ChatOpenAI
 from ai.prompts import LIGHTWEIGHT_RAG_PROMPT
 from ai.risk_model import predict_patient_risk
+from ai.inference_pool import InferenceBusyError, run_inference
 from app.vector.chroma_store import search_documents
 from app.queries.sql_templates import get_count_query
 from app.services.context_service import truncate_patient_history
-from database.db import get_connection
+from database.async_db import fetch_one
 from ai.config import CHATBOT_GREETINGS, SUPPORTED_LAB_TESTS
 
 async def handle_chat_stream(question: str):
@@ -53,11 +55,8 @@ async def handle_chat_stream(question: str):
         
         try:
             sql, params = get_count_query(entities)
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute(sql, params)
-            count = cur.fetchone()[0]
-            conn.close()
+            row = await fetch_one(sql, params)
+            count = row["count"]
             
             status_desc = f"{status} " if status else ""
             test_desc = f"{test_found} " if test_found else ""
@@ -85,7 +84,11 @@ async def handle_chat_stream(question: str):
     if is_risk and patient_match:
         yield f"data: {json.dumps({'type': 'status', 'content': 'Predicting patient risk...'})}\n\n"
         subject_id = int(patient_match.group())
-        risk_data = predict_patient_risk(subject_id)
+        # Score on the inference pool so other SSE streams keep flowing
+        try:
+            risk_data = await run_inference(predict_patient_risk, subject_id)
+        except InferenceBusyError as e:
+            risk_data = {"error": str(e)}
         
         if "error" in risk_data:
             prompt = f"Explain that we couldn't calculate risk for patient {subject_id} due to: {risk_data['error']}"
@@ -139,7 +142,13 @@ async def handle_chat_stream(question: str):
     state = {"question": question, "context": [], "numerical_result": "", "risk_data": {}}
     final_prompt = ""
     
-    for event in agent_app.stream(state):
+    # Graph nodes run blocking SQL / LLM calls: step the graph on a worker
+    # thread so other streams keep flowing while a node runs
+    events = agent_app.stream(state)
+    while True:
+        event = await asyncio.to_thread(next, events, None)
+        if event is None:
+            break
         for node_name, output in event.items():
             if node_name == "generate_response":
                 final_prompt = output["final_answer"]
@@ -0,0 +1,104 @@
+"""
+Dashboard Push Service (Server-Sent Events)
+Replaces per-tab polling of the ML dashboard aggregates: one background
+task watches the data version and, only when it changes, computes the
+aggregates once and fans the result out to every connected subscriber.
+
+- Version check: one primary-key read per POLL_INTERVAL, shared by all tabs
+  (also catches writes made by other processes, e.g. ingestion scripts)
+- Slow subscribers only ever hold the latest snapshot (queue of size 1)
+- The watcher stops when the last subscriber disconnects
+"""
+
+import asyncio
+import json
+
+from database.async_db import run_db
+from database.repository import get_data_version
+from app.services.report_service import report_high_risk_patients, unreviewed_critical_summary
+from app.services.risk_service import get_risk_distribution
+
+# Seconds between data version checks while anyone is subscribed
+POLL_INTERVAL = 2.0
+
+# Comment line sent on idle connections so proxies don't close them
+HEARTBEAT_SECONDS = 15.0
+
+
+def build_dashboard_snapshot(version: int):
+    """Aggregates shown by the live ML dashboard cards"""
+    return {
+        "data_version": version,
+        "risk_distribution": get_risk_distribution(),
+        "unreviewed_summary": unreviewed_critical_summary(),
+        "high_risk_patients": report_high_risk_patients()
+    }
+
+
+def _offer(queue: asyncio.Queue, payload: str):
+    # Drop an undelivered older snapshot, keep only the newest
+    if queue.full():
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+    queue.put_nowait(payload)
+
+
+class DashboardBroadcaster:
+    def __init__(self, poll_interval: float = POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._subscribers = set()
+        self._task = None
+        self._version = None
+        self._snapshot = None
+
+    def _ensure_watcher(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._watch())
+
+    async def _watch(self):
+        while self._subscribers:
+            try:
+                version = await run_db(get_data_version)
+                if version != self._version:
+                    snapshot = await run_db(build_dashboard_snapshot, version)
+                    self._version = version
+                    self._snapshot = json.dumps(snapshot)
+                    for queue in list(self._subscribers):
+                        _offer(queue, self._snapshot)
+            except Exception as e:
+                print(f"Dashboard push failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+        # Nobody listening: the next subscriber must not get a stale snapshot
+        self._version = None
+        self._snapshot = None
+
+    async def subscribe(self):
+        """
+        SSE event stream: the current snapshot right away (if known),
+        then one event per data version change.
+        """
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.add(queue)
+        if self._snapshot is not None:
+            _offer(queue, self._snapshot)
+        self._ensure_watcher()
+
+        try:
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {payload}\n\n"
+        finally:
+            self._subscribers.discard(queue)
+
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+dashboard_broadcaster = DashboardBroadcaster()
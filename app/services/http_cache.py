@@ -0,0 +1,65 @@
+"""
+Conditional GET for report / prediction endpoints
+ETags are derived from the lab data version, so a client that already has
+the current payload gets 304 Not Modified without the report being queried
+or serialized again.
+
+Usage (runs after authentication):
+    @app.get("/reports/summary", dependencies=[Depends(data_version_etag())])
+"""
+
+import time
+
+from fastapi import Depends, Request, Response
+
+from ai.risk_model import model_registry
+from app.services.auth_service import get_current_user
+from database.async_db import run_db
+from database.repository import get_data_version
+
+# A data version read this recently is reused without querying SQLite
+ETAG_VERSION_MAX_AGE = 1.0
+
+
+class NotModified(Exception):
+    """Raised by the ETag dependency when If-None-Match matches"""
+
+    def __init__(self, etag: str):
+        self.etag = etag
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" are the same tag
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+def data_version_etag(time_bucket_seconds: int = None, include_model: bool = False):
+    """
+    Dependency factory.
+
+    time_bucket_seconds: for clock-relative reports (e.g. last 24 hours),
+    the tag also changes every N seconds.
+    include_model: the tag also changes when the served risk model changes.
+    """
+    async def dependency(request: Request, response: Response,
+                         current_user=Depends(get_current_user)):
+        parts = [str(await run_db(get_data_version, max_age=ETAG_VERSION_MAX_AGE))]
+        if time_bucket_seconds:
+            parts.append(str(int(time.time() // time_bucket_seconds)))
+        if include_model:
+            parts.append(model_registry.version_tag())
+        etag = f'W/"{"-".join(parts)}"'
+
+        if _matches(request.headers.get("if-none-match"), etag):
+            raise NotModified(etag)
+
+        response.headers["ETag"] = etag
+        # Browsers may keep the body but must revalidate before reusing it
+        response.headers["Cache-Control"] = "private, no-cache"
+
+    return dependency
@@ -0,0 +1,98 @@
+"""
+Report Result Cache
+Memoizes report_service results per (function, arguments) and serves them
+until the lab data version changes (see database.repository.bump_data_version).
+
+- No TTL: an entry is valid exactly as long as the data it was built from
+- Single-flight: concurrent misses for the same key run the query once,
+  the other callers wait for and reuse that result
+- Cached values are shared between callers and must not be mutated
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from database.repository import get_data_version
+
+# Distinct (function, args) entries kept before evicting the least recently used
+MAX_ENTRIES = 256
+
+_entries = OrderedDict()
+_entries_lock = threading.Lock()
+_key_locks = {}
+
+
+def _key_lock(key):
+    with _entries_lock:
+        lock = _key_locks.get(key)
+        if lock is None:
+            lock = _key_locks[key] = threading.Lock()
+        return lock
+
+
+def _lookup(key, version):
+    with _entries_lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[0] == version:
+            _entries.move_to_end(key)
+            return True, entry[1]
+    return False, None
+
+
+def _store(key, version, value):
+    with _entries_lock:
+        _entries[key] = (version, value)
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            evicted, _ = _entries.popitem(last=False)
+            _key_locks.pop(evicted, None)
+
+
+def cached_report(fn=None, *, time_bucket_seconds: int = None):
+    """
+    Decorator: cache a report function until the data version changes.
+
+    time_bucket_seconds: for reports relative to "now" (e.g. last 24 hours),
+    also start a new entry every N seconds.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__name__, args, tuple(sorted(kwargs.items())))
+            if time_bucket_seconds:
+                key += (int(time.time() // time_bucket_seconds),)
+
+            version = get_data_version()
+            hit, value = _lookup(key, version)
+            if hit:
+                return value
+
+            with _key_lock(key):
+                # Another caller may have filled it while we waited
+                hit, value = _lookup(key, version)
+                if hit:
+                    return value
+                value = func(*args, **kwargs)
+                _store(key, version, value)
+                return value
+
+        wrapper.uncached = func
+        return wrapper
+
+    return decorator(fn) if fn is not None else decorator
+
+
+def clear_report_cache():
+    """Drop every cached report (e.g. after out-of-band writes)"""
+    with _entries_lock:
+        _entries.clear()
+        _key_locks.clear()
+
+
+def report_cache_stats():
+    """Entry count and current data version (for diagnostics)"""
+    with _entries_lock:
+        size = len(_entries)
+    return {"entries": size, "data_version": get_data_version()}
@@ -1,27 +1,56 @@
-from database.db import get_connection as get_db
-from datetime import datetime, timedelta
+from database.db import get_read_connection as get_db
+from database.repository import get_lab_aggregates_by_subject, mark_critical_reviewed
+from app.services.report_cache import cached_report
+import base64
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+
+# Rollup queries shared by the single-report functions and report_dashboard
+
+SUMMARY_SQL = """
+    SELECT
+        status,
+        lab_count AS count
+    FROM rollup_status_counts
+    WHERE lab_count > 0
+"""
+
+BY_LAB_SQL = """
+    SELECT
+        test_name,
+        status,
+        patient_count
+    FROM rollup_test_status_counts
+    ORDER BY patient_count DESC
+"""
+
+BY_GENDER_SQL = """
+    SELECT
+        NULLIF(gender, '') AS gender,
+        status,
+        patient_count
+    FROM rollup_gender_status_counts
+"""
 
 
 # =====================================================
 # OVERALL STATUS SUMMARY
 # =====================================================
 
+@cached_report
 def report_summary():
     """
     Counts labs by status:
     NORMAL / ABNORMAL / CRITICAL / UNKNOWN
+    (read from the rollup_status_counts rollup)
     """
 
     conn = get_db()
     cur = conn.cursor()
 
-    cur.execute("""
-        SELECT
-            COALESCE(status, 'UNKNOWN') AS status,
-            COUNT(*) AS count
-        FROM lab_interpretations
-        GROUP BY COALESCE(status, 'UNKNOWN')
-    """)
+    cur.execute(SUMMARY_SQL)
 
     rows = [dict(r) for r in cur.fetchall()]
     conn.close()
@@ -33,12 +62,14 @@ def report_summary():
 # PATIENT RISK DISTRIBUTION
 # =====================================================
 
+@cached_report
 def report_patient_risk_distribution():
     """
     Patient-level risk classification (Optimized SQL version):
     - CRITICAL: level 2
     - ABNORMAL: level 1
     - NORMAL: level 0
+    Patients per level come from the rollup_risk_level_counts rollup.
     """
 
     conn = get_db()
@@ -51,21 +82,8 @@ def report_patient_risk_distribution():
                 WHEN 1 THEN 'ABNORMAL'
                 ELSE 'NORMAL'
             END AS risk_label,
-            COUNT(*) AS count
-        FROM (
-            SELECT
-                subject_id,
-                MAX(
-                    CASE
-                        WHEN status = 'CRITICAL' THEN 2
-                        WHEN status = 'ABNORMAL' THEN 1
-                        ELSE 0
-                    END
-                ) AS risk_level
-            FROM lab_interpretations
-            GROUP BY subject_id
-        )
-        GROUP BY risk_level
+            patient_count AS count
+        FROM rollup_risk_level_counts
     """)
 
     rows = cur.fetchall()
@@ -87,6 +105,7 @@ def report_patient_risk_distribution():
 # HIGH-RISK PATIENT COUNT
 # =====================================================
 
+@cached_report
 def report_high_risk_patients():
     """
     Count of patients with at least one CRITICAL lab
@@ -112,24 +131,17 @@ def report_high_risk_patients():
 # LAB IMPACT ANALYSIS
 # =====================================================
 
+@cached_report
 def report_by_lab():
     """
     Most impacted lab tests (abnormal + critical)
+    Distinct-patient counts come from the rollup_test_status_counts rollup.
     """
 
     conn = get_db()
     cur = conn.cursor()
 
-    cur.execute("""
-        SELECT
-            test_name,
-            status,
-            COUNT(DISTINCT subject_id) AS patient_count
-        FROM lab_interpretations
-        WHERE status IN ('ABNORMAL', 'CRITICAL')
-        GROUP BY test_name, status
-        ORDER BY patient_count DESC
-    """)
+    cur.execute(BY_LAB_SQL)
 
     rows = [dict(r) for r in cur.fetchall()]
     conn.close()
@@ -141,23 +153,17 @@ def report_by_lab():
 # GENDER RISK SPLIT
 # =====================================================
 
+@cached_report
 def report_by_gender():
     """
     Abnormal & critical labs grouped by gender
+    Distinct-patient counts come from the rollup_gender_status_counts rollup.
     """
 
     conn = get_db()
     cur = conn.cursor()
 
-    cur.execute("""
-        SELECT
-            gender,
-            status,
-            COUNT(DISTINCT subject_id) AS patient_count
-        FROM lab_interpretations
-        WHERE status IN ('ABNORMAL', 'CRITICAL')
-        GROUP BY gender, status
-    """)
+    cur.execute(BY_GENDER_SQL)
 
     rows = [dict(r) for r in cur.fetchall()]
     conn.close()
@@ -169,32 +175,147 @@ def report_by_gender():
 # UNREVIEWED CRITICAL ALERTS (RAW)
 # =====================================================
 
-def unreviewed_critical():
+# Columns a client may request from the alert queue
+ALERT_COLUMNS = (
+    "id", "subject_id", "hadm_id", "test_name", "value", "unit",
+    "gender", "status", "reason", "processed_time", "reviewed"
+)
+
+ALERT_PAGE_MAX = 500
+
+
+def _encode_alert_cursor(row):
+    raw = json.dumps([row["processed_time"], row["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_alert_cursor(cursor: str):
+    try:
+        processed_time, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return processed_time, int(last_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def _alert_index(test_name: str = None, subject_id: int = None) -> str:
+    # Pinned with INDEXED BY: without ANALYZE statistics SQLite prefers
+    # idx_lab_status and sorts every CRITICAL row for each page
+    if subject_id is not None:
+        return "idx_lab_unreviewed_critical_subject"
+    if test_name is not None:
+        return "idx_lab_unreviewed_critical_test"
+    return "idx_lab_unreviewed_critical"
+
+
+def unreviewed_critical(limit: int = 50, cursor: str = None, columns=None,
+                        test_name: str = None, subject_id: int = None):
     """
-    Raw list of CRITICAL labs not yet reviewed
+    One page of CRITICAL labs not yet reviewed, newest first.
+
+    Keyset pagination on (processed_time, id) over the partial indexes
+    idx_lab_unreviewed_critical[_test|_subject], so every page is a bounded
+    range scan however deep the queue is. Rows without processed_time come
+    after all timed rows.
+
+    Returns: {"items": [...], "next_cursor": str | None}
     """
+    limit = max(1, min(int(limit), ALERT_PAGE_MAX))
+    columns = list(columns or ALERT_COLUMNS)
+    unknown = [c for c in columns if c not in ALERT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+
+    # id / processed_time are always read to build the next cursor
+    select_cols = ", ".join(dict.fromkeys(columns + ["processed_time", "id"]))
+
+    filters = "status = 'CRITICAL' AND reviewed = 0"
+    params = []
+    if test_name is not None:
+        filters += " AND test_name = ?"
+        params.append(test_name)
+    if subject_id is not None:
+        filters += " AND subject_id = ?"
+        params.append(subject_id)
+
+    after_time, after_id = _decode_alert_cursor(cursor) if cursor else (None, None)
+    index = _alert_index(test_name, subject_id)
 
     conn = get_db()
     cur = conn.cursor()
+    rows = []
+
+    # Timed rows, (processed_time, id) descending
+    if cursor is None or after_time is not None:
+        keyset, keyset_params = "processed_time IS NOT NULL", []
+        if cursor is not None:
+            keyset, keyset_params = "(processed_time, id) < (?, ?)", [after_time, after_id]
+        cur.execute(f"""
+            SELECT {select_cols}
+            FROM lab_interpretations INDEXED BY {index}
+            WHERE {filters}
+              AND {keyset}
+            ORDER BY processed_time DESC, id DESC
+            LIMIT ?
+        """, params + keyset_params + [limit + 1])
+        rows = cur.fetchall()
+
+    # Then rows with no processed_time, id descending
+    if len(rows) <= limit:
+        keyset, keyset_params = "", []
+        if after_time is None and after_id is not None:
+            keyset, keyset_params = "AND id < ?", [after_id]
+        cur.execute(f"""
+            SELECT {select_cols}
+            FROM lab_interpretations INDEXED BY {index}
+            WHERE {filters}
+              AND processed_time IS NULL
+              {keyset}
+            ORDER BY id DESC
+            LIMIT ?
+        """, params + keyset_params + [limit + 1 - len(rows)])
+        rows += cur.fetchall()
 
-    cur.execute("""
-        SELECT *
-        FROM lab_interpretations
-        WHERE status = 'CRITICAL'
-          AND reviewed = 0
-        ORDER BY processed_time DESC
-    """)
-
-    rows = [dict(r) for r in cur.fetchall()]
     conn.close()
 
-    return rows
+    page = rows[:limit]
+    next_cursor = _encode_alert_cursor(page[-1]) if len(rows) > limit else None
+
+    return {
+        "items": [{c: r[c] for c in columns} for r in page],
+        "next_cursor": next_cursor
+    }
+
+
+# =====================================================
+# ACKNOWLEDGE CRITICAL ALERTS (BULK REVIEW)
+# =====================================================
+
+def review_critical_alerts(ids=None, subject_id: int = None, test_name: str = None,
+                           processed_before: str = None):
+    """
+    Mark critical alerts reviewed by id list, subject and/or filter
+    (one transaction), then return the new pending-alert counts.
+    processed_before: ISO datetime (naive = UTC) or epoch seconds
+    """
+
+    reviewed = mark_critical_reviewed(
+        ids=ids,
+        subject_id=subject_id,
+        test_name=test_name,
+        processed_before_epoch=_to_epoch(processed_before) if processed_before is not None else None
+    )
+
+    return {
+        "reviewed": reviewed,
+        "unreviewed": unreviewed_critical_summary()
+    }
 
 
 # =====================================================
 # UNREVIEWED CRITICAL SUMMARY (DASHBOARD FRIENDLY)
 # =====================================================
 
+@cached_report
 def unreviewed_critical_summary():
     """
     Summary of pending critical alerts
@@ -222,13 +343,14 @@ def unreviewed_critical_summary():
 # RECENT CRITICAL ACTIVITY (LAST 24 HOURS)
 # =====================================================
 
+@cached_report(time_bucket_seconds=60)
 def recent_critical_activity(hours: int = 24):
     """
     Recent CRITICAL labs in the last N hours
     Useful for real-time alert panels
     """
 
-    since_time = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
+    since_epoch = int(time.time()) - hours * 3600
 
     conn = get_db()
     cur = conn.cursor()
@@ -239,12 +361,171 @@ def recent_critical_activity(hours: int = 24):
             COUNT(*) AS count
         FROM lab_interpretations
         WHERE status = 'CRITICAL'
-          AND processed_time >= ?
+          AND processed_epoch >= ?
         GROUP BY test_name
         ORDER BY count DESC
-    """, (since_time,))
+    """, (since_epoch,))
 
     rows = [dict(r) for r in cur.fetchall()]
     conn.close()
 
     return rows
+
+
+# =====================================================
+# CRITICAL / ABNORMAL ACTIVITY HISTOGRAM
+# =====================================================
+
+BUCKET_SECONDS = {"hour": 3600, "day": 86400}
+HISTOGRAM_DEFAULT_RANGE = {"hour": timedelta(hours=24), "day": timedelta(days=30)}
+HISTOGRAM_MAX_BUCKETS = 2000
+
+
+def _to_epoch(value) -> int:
+    """ISO datetime (naive = UTC) or epoch seconds -> epoch seconds"""
+    if isinstance(value, (int, float)) or str(value).lstrip("-").isdigit():
+        return int(value)
+    try:
+        dt = datetime.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f"Invalid datetime: {value}")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+@cached_report(time_bucket_seconds=60)
+def critical_activity_histogram(bucket: str = "hour", start=None, end=None):
+    """
+    CRITICAL and ABNORMAL lab counts per hour/day bucket (UTC) over
+    [start, end). Defaults: last 24 hours (hour) or 30 days (day).
+    Counted with range scans on idx_lab_status_epoch; empty buckets are 0.
+    """
+
+    if bucket not in BUCKET_SECONDS:
+        raise ValueError(f"bucket must be one of: {', '.join(BUCKET_SECONDS)}")
+    width = BUCKET_SECONDS[bucket]
+
+    end_epoch = _to_epoch(end) if end is not None else int(time.time())
+    start_epoch = (
+        _to_epoch(start) if start is not None
+        else end_epoch - int(HISTOGRAM_DEFAULT_RANGE[bucket].total_seconds())
+    )
+    if start_epoch >= end_epoch:
+        raise ValueError("start must be before end")
+
+    first_bucket = start_epoch // width * width
+    n_buckets = (end_epoch - 1 - first_bucket) // width + 1
+    if n_buckets > HISTOGRAM_MAX_BUCKETS:
+        raise ValueError(f"Range too large: {n_buckets} buckets (max {HISTOGRAM_MAX_BUCKETS})")
+
+    conn = get_db()
+    cur = conn.cursor()
+
+    cur.execute("""
+        SELECT
+            status,
+            processed_epoch / ? * ? AS bucket_epoch,
+            COUNT(*) AS count
+        FROM lab_interpretations
+        WHERE status IN ('CRITICAL', 'ABNORMAL')
+          AND processed_epoch >= ?
+          AND processed_epoch < ?
+        GROUP BY status, bucket_epoch
+    """, (width, width, start_epoch, end_epoch))
+
+    counts = {(r["status"], r["bucket_epoch"]): r["count"] for r in cur.fetchall()}
+    conn.close()
+
+    buckets = []
+    for i in range(n_buckets):
+        bucket_epoch = first_bucket + i * width
+        buckets.append({
+            "bucket_start": datetime.fromtimestamp(bucket_epoch, timezone.utc).isoformat(),
+            "CRITICAL": counts.get(("CRITICAL", bucket_epoch), 0),
+            "ABNORMAL": counts.get(("ABNORMAL", bucket_epoch), 0)
+        })
+
+    return {
+        "bucket": bucket,
+        "start": datetime.fromtimestamp(start_epoch, timezone.utc).isoformat(),
+        "end": datetime.fromtimestamp(end_epoch, timezone.utc).isoformat(),
+        "buckets": buckets
+    }
+
+
+# =====================================================
+# DASHBOARD BOOTSTRAP (ALL PANELS, ONE CONNECTION)
+# =====================================================
+
+@cached_report
+def report_dashboard(alert_limit: int = 5):
+    """
+    Everything the /dashboard page renders, in one payload:
+    status summary, per-lab and per-gender splits (rollups),
+    pending critical alert counts and the newest alerts
+    """
+
+    conn = get_db()
+    cur = conn.cursor()
+
+    cur.execute(SUMMARY_SQL)
+    summary = [dict(r) for r in cur.fetchall()]
+
+    cur.execute(BY_LAB_SQL)
+    by_lab = [dict(r) for r in cur.fetchall()]
+
+    cur.execute(BY_GENDER_SQL)
+    by_gender = [dict(r) for r in cur.fetchall()]
+
+    cur.execute("""
+        SELECT
+            COUNT(*) AS total_unreviewed,
+            COUNT(DISTINCT subject_id) AS affected_patients
+        FROM lab_interpretations
+        WHERE status = 'CRITICAL'
+          AND reviewed = 0
+    """)
+    unreviewed = dict(cur.fetchone())
+
+    cur.execute("""
+        SELECT
+            id,
+            subject_id,
+            test_name,
+            value,
+            unit,
+            processed_time
+        FROM lab_interpretations INDEXED BY idx_lab_unreviewed_critical
+        WHERE status = 'CRITICAL'
+          AND reviewed = 0
+        ORDER BY processed_time DESC, id DESC
+        LIMIT ?
+    """, (alert_limit,))
+    critical_alerts = [dict(r) for r in cur.fetchall()]
+
+    conn.close()
+
+    return {
+        "summary": summary,
+        "by_lab": by_lab,
+        "by_gender": by_gender,
+        "unreviewed_summary": unreviewed,
+        "critical_alerts": critical_alerts
+    }
+
+
+# =====================================================
+# PATIENT LAB AGGREGATES (RUNNING, PER TEST)
+# =====================================================
+
+def patient_lab_aggregates(subject_id: int):
+    """
+    Latest value, min, max, mean, count and last change per test
+    for one patient, from the incrementally maintained lab_aggregates table
+    """
+
+    return {
+        "subject_id": subject_id,
+        "tests": get_lab_aggregates_by_subject(subject_id)
+    }
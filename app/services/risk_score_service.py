@@ -0,0 +1,267 @@
+"""
+Materialized Patient Risk Scores
+Keeps patient_risk_scores in sync with lab_interpretations so the ML
+dashboard reads stored predictions instead of re-scoring every patient.
+
+- Incremental: only subjects with lab rows newer than the last run
+  (lab_interpretations.id > watermark) are re-scored
+- Full rebuild: whenever the loaded model version differs from the one
+  the table was built with
+"""
+
+import threading
+from datetime import datetime
+
+from database.db import get_connection as get_db, get_read_connection
+from database.repository import add_insert_listener, bump_data_version
+from ai.risk_model import model_registry, predict_patient_risk_batch
+
+# Patients scored per predict_patient_risk_batch call
+RESCORE_BATCH_SIZE = 5000
+
+META_WATERMARK = "risk_scores.watermark"
+META_MODEL_VERSION = "risk_scores.model_version"
+
+UPSERT_SQL = """
+INSERT INTO patient_risk_scores (
+    subject_id,
+    risk_level,
+    risk_label,
+    confidence,
+    prob_normal,
+    prob_abnormal,
+    prob_critical,
+    model_version,
+    scored_at,
+    data_watermark
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(subject_id) DO UPDATE SET
+    risk_level = excluded.risk_level,
+    risk_label = excluded.risk_label,
+    confidence = excluded.confidence,
+    prob_normal = excluded.prob_normal,
+    prob_abnormal = excluded.prob_abnormal,
+    prob_critical = excluded.prob_critical,
+    model_version = excluded.model_version,
+    scored_at = excluded.scored_at,
+    data_watermark = excluded.data_watermark
+"""
+
+_rescore_lock = threading.Lock()
+
+
+def _get_meta(cur, key):
+    cur.execute("SELECT value FROM app_meta WHERE key = ?", (key,))
+    row = cur.fetchone()
+    return row["value"] if row else None
+
+
+def _set_meta(cur, key, value):
+    cur.execute("""
+        INSERT INTO app_meta (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    """, (key, str(value)))
+
+
+def refresh_risk_scores(full: bool = False):
+    """
+    Bring patient_risk_scores up to date.
+
+    full=True forces a rebuild; it also happens automatically when the
+    model version changed since the table was filled.
+    Returns: {'mode': 'full' | 'incremental' | 'noop', 'rescored': int, ...}
+    """
+    snapshot = model_registry.get()
+    if snapshot is None:
+        return {'mode': 'noop', 'rescored': 0, 'error': 'Model not trained'}
+
+    with _rescore_lock:
+        conn = get_db()
+        cur = conn.cursor()
+
+        watermark = int(_get_meta(cur, META_WATERMARK) or 0)
+        scored_version = _get_meta(cur, META_MODEL_VERSION)
+
+        cur.execute("SELECT COALESCE(MAX(id), 0) AS max_id FROM lab_interpretations")
+        high = cur.fetchone()["max_id"]
+
+        full = full or scored_version != snapshot.version
+        if not full and high <= watermark:
+            conn.close()
+            return {'mode': 'noop', 'rescored': 0, 'watermark': watermark}
+
+        if full:
+            cur.execute("SELECT DISTINCT subject_id FROM lab_interpretations WHERE id <= ?", (high,))
+        else:
+            # Rowid range scan: cost is proportional to the new rows only
+            cur.execute("""
+                SELECT DISTINCT subject_id
+                FROM lab_interpretations
+                WHERE id > ? AND id <= ?
+            """, (watermark, high))
+        subject_ids = [r["subject_id"] for r in cur.fetchall()]
+
+        try:
+            # Score everything before taking the write lock: predictions
+            # (feature store sync, aggregate reads, forest) can take seconds
+            rows = []
+            for start in range(0, len(subject_ids), RESCORE_BATCH_SIZE):
+                batch = subject_ids[start:start + RESCORE_BATCH_SIZE]
+                rows.extend(
+                    (
+                        s['subject_id'],
+                        s['risk_level'],
+                        s['risk_label'],
+                        s['confidence'],
+                        s['probabilities']['normal'],
+                        s['probabilities']['abnormal'],
+                        s['probabilities']['critical'],
+                        s['model_version'],
+                        s['predicted_at'],
+                        high
+                    )
+                    for s in predict_patient_risk_batch(batch)
+                    if 'risk_level' in s
+                )
+            rescored = len(rows)
+
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                if full:
+                    cur.execute("DELETE FROM patient_risk_scores")
+                cur.executemany(UPSERT_SQL, rows)
+                _set_meta(cur, META_WATERMARK, high)
+                _set_meta(cur, META_MODEL_VERSION, snapshot.version)
+                # Stored predictions changed: invalidate caches / notify pushes
+                bump_data_version(cur)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    return {
+        'mode': 'full' if full else 'incremental',
+        'rescored': rescored,
+        'watermark': high,
+        'model_version': snapshot.version
+    }
+
+
+# =====================================================
+# READ PATH (used by /predict/*)
+# =====================================================
+
+def _row_to_score(row):
+    return {
+        'subject_id': row['subject_id'],
+        'risk_level': row['risk_level'],
+        'risk_label': row['risk_label'],
+        'confidence': row['confidence'],
+        'predicted_at': row['scored_at'],
+        'model_version': row['model_version'],
+        'probabilities': {
+            'normal': row['prob_normal'],
+            'abnormal': row['prob_abnormal'],
+            'critical': row['prob_critical']
+        }
+    }
+
+
+def stored_risk_distribution():
+    """
+    Patient counts per predicted risk label from the materialized table
+    (as stored; the rescoring worker brings it up to date)
+    """
+    rescoring_worker.trigger()
+
+    conn = get_read_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT risk_label, COUNT(*) AS count
+        FROM patient_risk_scores
+        GROUP BY risk_label
+    """)
+    rows = cur.fetchall()
+    conn.close()
+
+    distribution = {'NORMAL': 0, 'ABNORMAL': 0, 'CRITICAL': 0}
+    for row in rows:
+        distribution[row['risk_label']] = row['count']
+    distribution['total'] = sum(distribution.values())
+    return distribution
+
+
+def stored_high_risk_patients(risk_level: int = 2, limit: int = 50):
+    """
+    Highest-confidence patients at or above risk_level from the materialized table
+    (as stored; the rescoring worker brings it up to date)
+    """
+    rescoring_worker.trigger()
+
+    conn = get_read_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT *
+        FROM patient_risk_scores
+        WHERE risk_level >= ?
+        ORDER BY confidence DESC
+        LIMIT ?
+    """, (risk_level, limit))
+    rows = cur.fetchall()
+    conn.close()
+
+    return [_row_to_score(r) for r in rows]
+
+
+# =====================================================
+# BACKGROUND RESCORING WORKER
+# =====================================================
+
+class RiskRescoringWorker:
+    """
+    Daemon thread that runs refresh_risk_scores() when signalled.
+    Bursts of trigger() calls (e.g. many ingestion batches) are coalesced
+    into a single incremental run.
+    """
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="risk-rescoring", daemon=True
+        )
+        self._thread.start()
+
+    def trigger(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                result = refresh_risk_scores()
+                if result['rescored']:
+                    print(f"✓ Risk scores refreshed ({result['mode']}): "
+                          f"{result['rescored']} patients at {datetime.now().isoformat()}")
+            except Exception as e:
+                print(f"Risk rescoring failed: {e}")
+
+
+rescoring_worker = RiskRescoringWorker()
+
+
+def start_rescoring_worker():
+    """
+    Start the worker, rescore after every insert_lab_results_bulk in this
+    process, and catch up on anything inserted while the app was down.
+    """
+    rescoring_worker.start()
+    add_insert_listener(rescoring_worker.trigger)
+    rescoring_worker.trigger()
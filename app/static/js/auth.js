@@ -13,7 +13,10 @@ async function authFetch(url, options = {}) {
         headers.set('Authorization', `Bearer ${token}`);
     }
 
+    // Report endpoints send ETags: "no-cache" makes the browser revalidate
+    // its stored copy with If-None-Match and reuse it on 304 Not Modified
     const fetchOptions = {
+        cache: "no-cache",
         ...options,
         headers: headers
     };
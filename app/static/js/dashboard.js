@@ -4,11 +4,8 @@
 // =====================================================
 // DASHBOARD SUMMARY COUNTS
 // =====================================================
-async function loadSummary() {
+function renderSummary(data) {
     try {
-        const res = await authFetch("/reports/summary");
-        const data = await res.json();
-
         let total = 0, normal = 0, abnormal = 0, critical = 0, unknown = 0;
 
         if (Array.isArray(data)) {
@@ -39,11 +36,8 @@ async function loadSummary() {
 // =====================================================
 // BAR CHART – AFFECTED TESTS
 // =====================================================
-async function loadLabChart() {
+function renderLabChart(data) {
     try {
-        const res = await authFetch("/reports/by-lab");
-        const data = await res.json();
-
         const labMap = {};
         if (Array.isArray(data)) {
             data.forEach(row => {
@@ -75,11 +69,8 @@ async function loadLabChart() {
 // =====================================================
 // PIE CHART – GENDER DISTRIBUTION
 // =====================================================
-async function loadGenderChart() {
+function renderGenderChart(data) {
     try {
-        const res = await authFetch("/reports/by-gender");
-        const data = await res.json();
-
         const genderMap = {};
         if (Array.isArray(data)) {
             data.forEach(row => {
@@ -109,11 +100,8 @@ async function loadGenderChart() {
 // =====================================================
 // DOUGHNUT CHART – STATUS OVERVIEW
 // =====================================================
-async function loadStatusChart() {
+function renderStatusChart(data) {
     try {
-        const res = await authFetch("/reports/summary");
-        const data = await res.json();
-
         if (Array.isArray(data)) {
             new Chart(document.getElementById("statusChart"), {
                 type: "doughnut",
@@ -139,11 +127,8 @@ async function loadStatusChart() {
 // =====================================================
 // TABLE – TOP AFFECTED TESTS
 // =====================================================
-async function loadTopTestsTable() {
+function renderTopTestsTable(data) {
     try {
-        const res = await authFetch("/reports/by-lab");
-        const data = await res.json();
-
         const tbody = document.querySelector("#topTestsTable tbody");
         tbody.innerHTML = "";
 
@@ -168,15 +153,12 @@ async function loadTopTestsTable() {
 // =====================================================
 // ALERT PANEL – UNREVIEWED CRITICAL
 // =====================================================
-async function loadCriticalAlerts() {
+function renderCriticalAlerts(data) {
     try {
-        const res = await authFetch("/reports/unreviewed-critical");
-        const data = await res.json();
-
         const alertBox = document.getElementById("criticalAlerts");
         alertBox.innerHTML = "";
 
-        if (data.length === 0) {
+        if (!Array.isArray(data) || data.length === 0) {
             alertBox.innerHTML = "<li>No pending critical alerts 🎉</li>";
             return;
         }
@@ -196,13 +178,31 @@ async function loadCriticalAlerts() {
 }
 
 // =====================================================
-// INITIAL DASHBOARD LOAD
+// INITIAL DASHBOARD LOAD (ONE REQUEST FOR ALL PANELS)
 // =====================================================
-document.addEventListener("DOMContentLoaded", () => {
-    loadSummary();
-    loadLabChart();
-    loadGenderChart();
-    loadStatusChart();
-    loadTopTestsTable();
-    loadCriticalAlerts();
-});
+async function loadDashboard() {
+    let data = {};
+    try {
+        const res = await authFetch("/reports/dashboard");
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        data = await res.json();
+    } catch (error) {
+        console.error("Error loading dashboard:", error);
+        ["totalLabs", "normalCount", "abnormalCount", "criticalCount", "unknownCount"]
+            .forEach(id => document.getElementById(id).innerText = "Error");
+        document.querySelector("#topTestsTable tbody").innerHTML =
+            "<tr><td colspan='3'>Error loading data</td></tr>";
+        document.getElementById("criticalAlerts").innerHTML =
+            "<li>Error loading alerts</li>";
+        return;
+    }
+
+    renderSummary(data.summary);
+    renderLabChart(data.by_lab);
+    renderGenderChart(data.by_gender);
+    renderStatusChart(data.summary);
+    renderTopTestsTable(data.by_lab);
+    renderCriticalAlerts(data.critical_alerts);
+}
+
+document.addEventListener("DOMContentLoaded", loadDashboard);
@@ -10,14 +10,16 @@ let currentRiskLevel = 2;
 // =====================================================
 // 1. LOAD RISK DISTRIBUTION (Cards: 0, 47, 53)
 // =====================================================
+function renderRiskDistribution(data) {
+    document.getElementById("riskNormalCount").innerText = data.NORMAL || 0;
+    document.getElementById("riskAbnormalCount").innerText = data.ABNORMAL || 0;
+    document.getElementById("riskCriticalCount").innerText = data.CRITICAL || 0;
+}
+
 async function loadRiskDistribution() {
     try {
         const res = await authFetch("/predict/risk-distribution");
-        const data = await res.json();
-
-        document.getElementById("riskNormalCount").innerText = data.NORMAL || 0;
-        document.getElementById("riskAbnormalCount").innerText = data.ABNORMAL || 0;
-        document.getElementById("riskCriticalCount").innerText = data.CRITICAL || 0;
+        renderRiskDistribution(await res.json());
     } catch (error) {
         console.error("Error loading risk distribution:", error);
         document.getElementById("riskNormalCount").innerText = "N/A";
@@ -119,13 +121,15 @@ async function loadRecentCriticalChart() {
 // =====================================================
 // 4. UNREVIEWED CRITICAL SUMMARY
 // =====================================================
+function renderUnreviewedCriticalSummary(data) {
+    document.getElementById("totalUnreviewed").innerText = data.total_unreviewed || 0;
+    document.getElementById("affectedPatients").innerText = data.affected_patients || 0;
+}
+
 async function loadUnreviewedCriticalSummary() {
     try {
         const res = await authFetch("/reports/unreviewed-critical-summary");
-        const data = await res.json();
-
-        document.getElementById("totalUnreviewed").innerText = data.total_unreviewed || 0;
-        document.getElementById("affectedPatients").innerText = data.affected_patients || 0;
+        renderUnreviewedCriticalSummary(await res.json());
     } catch (error) {
         console.error("Error loading unreviewed summary:", error);
         document.getElementById("totalUnreviewed").innerText = "N/A";
@@ -136,12 +140,14 @@ async function loadUnreviewedCriticalSummary() {
 // =====================================================
 // 5. HIGH-RISK PATIENT COUNT
 // =====================================================
+function renderHighRiskPatientCount(data) {
+    document.getElementById("criticalPatientCount").innerText = data.critical_patients || 0;
+}
+
 async function loadHighRiskPatientCount() {
     try {
         const res = await authFetch("/reports/high-risk-patients");
-        const data = await res.json();
-
-        document.getElementById("criticalPatientCount").innerText = data.critical_patients || 0;
+        renderHighRiskPatientCount(await res.json());
     } catch (error) {
         console.error("Error loading high-risk count:", error);
         document.getElementById("criticalPatientCount").innerText = "N/A";
@@ -241,14 +247,47 @@ async function initMLDashboard() {
     await loadHighRiskPatients(2, 100);
 }
 
+// =====================================================
+// LIVE UPDATES (SERVER-SENT EVENTS)
+// =====================================================
+// The server pushes the risk stats only when the data changes (not the
+// table - user controls that). fetch() instead of EventSource so authFetch
+// can send the Bearer token. Reconnects after a pause if the stream drops.
+const LIVE_RECONNECT_MS = 5000;
+
+async function subscribeDashboardUpdates() {
+    try {
+        const response = await authFetch("/reports/stream");
+        if (!response || !response.ok) throw new Error(`HTTP ${response && response.status}`);
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+
+            buffer += decoder.decode(value, { stream: true });
+            const events = buffer.split("\n\n");
+            buffer = events.pop();
+
+            for (const event of events) {
+                if (!event.startsWith("data: ")) continue;  // keepalive comments
+                const data = JSON.parse(event.substring(6));
+                renderRiskDistribution(data.risk_distribution);
+                renderUnreviewedCriticalSummary(data.unreviewed_summary);
+                renderHighRiskPatientCount(data.high_risk_patients);
+            }
+        }
+    } catch (error) {
+        console.error("Live dashboard stream error:", error);
+    }
+    setTimeout(subscribeDashboardUpdates, LIVE_RECONNECT_MS);
+}
+
 // Load on page init
 document.addEventListener("DOMContentLoaded", () => {
     initMLDashboard();
+    subscribeDashboardUpdates();
 });
-
-// Auto-refresh risk stats every 30 seconds (not the table - user controls that)
-setInterval(() => {
-    loadRiskDistribution();
-    loadUnreviewedCriticalSummary();
-    loadHighRiskPatientCount();
-}, 30000);
@@ -0,0 +1,76 @@
+"""
+Async Database Access
+Awaitable wrappers that run blocking sqlite3 work on a bounded thread pool,
+so async FastAPI handlers (and SSE streams) never stall the event loop
+while a query runs.
+
+- run_db(fn, ...)      any existing sync repository / service function
+- fetch_one / fetch_all read-only ad-hoc queries, rows returned as dicts
+
+Configuration (environment variables):
+- DB_POOL_THREADS   max queries running at once (default 8); further calls queue
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from database.db import get_read_connection
+
+DB_POOL_THREADS = int(os.getenv("DB_POOL_THREADS", 8))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_db_executor():
+    """Lazily create the shared database thread pool"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=DB_POOL_THREADS,
+                    thread_name_prefix="db"
+                )
+    return _executor
+
+
+async def run_db(fn, *args, **kwargs):
+    """Await fn(*args, **kwargs) on the database pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), partial(fn, *args, **kwargs))
+
+
+def _fetch(sql, params, one):
+    conn = get_read_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        if one:
+            row = cur.fetchone()
+            return dict(row) if row else None
+        return [dict(r) for r in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+async def fetch_one(sql: str, params=()):
+    """First row of a query as a dict (None if no rows)"""
+    return await run_db(_fetch, sql, params, True)
+
+
+async def fetch_all(sql: str, params=()):
+    """All rows of a query as dicts"""
+    return await run_db(_fetch, sql, params, False)
+
+
+def shutdown_db_pool():
+    """Stop the pool (called on app shutdown)"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
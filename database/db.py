@@ -1,4 +1,6 @@
+import os
 import sqlite3
+import threading
 from pathlib import Path
 
 # Database file path
@@ -7,19 +9,100 @@ DB_PATH = Path("database/lab_results.db")
 # Ensure database directory exists
 DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
+# Connection tuning (environment variables)
+# WAL lets readers run while a writer (e.g. ingestion) is committing
+JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+# NORMAL is durable at every checkpoint and safe with WAL; FULL fsyncs each commit
+SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+# Page cache per connection, KiB
+CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 65536))
+# Bytes of the database file read through mmap (0 disables)
+MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 268435456))
+# How long to wait for a lock held by another connection, ms
+BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+# Idle connections kept per thread and kind (reader / writer)
+POOL_IDLE_PER_THREAD = int(os.getenv("SQLITE_POOL_IDLE_PER_THREAD", 2))
 
-def get_connection() -> sqlite3.Connection:
-    """
-    Returns a SQLite database connection.
 
-    - check_same_thread=False is required for FastAPI background tasks
-    - row_factory allows dict-like access to rows
+class PooledConnection(sqlite3.Connection):
     """
+    sqlite3 connection whose close() returns it to its thread's pool.
+    Any transaction left open is rolled back first, so a reused connection
+    always starts clean.
+    """
+
+    _pool = None
+
+    def close(self):
+        pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        try:
+            if self.in_transaction:
+                self.rollback()
+            self.row_factory = sqlite3.Row
+        except sqlite3.Error:
+            sqlite3.Connection.close(self)
+            return
+        if len(pool) < POOL_IDLE_PER_THREAD:
+            pool.append(self)
+        else:
+            sqlite3.Connection.close(self)
 
+
+_local = threading.local()
+
+
+def _thread_pool(kind: str) -> list:
+    # Connections must not cross a fork (e.g. process-mode inference workers)
+    if getattr(_local, "pid", None) != os.getpid():
+        _local.pid = os.getpid()
+        _local.pools = {"read": [], "write": []}
+    return _local.pools[kind]
+
+
+def _open(read_only: bool) -> PooledConnection:
     conn = sqlite3.connect(
         DB_PATH,
         check_same_thread=False,
-        isolation_level=None  # autocommit mode (safer for concurrent reads)
+        isolation_level=None,  # autocommit mode (safer for concurrent reads)
+        factory=PooledConnection
     )
     conn.row_factory = sqlite3.Row
+
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size = {-CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute(f"PRAGMA synchronous = {SYNCHRONOUS}")
+    if read_only:
+        conn.execute("PRAGMA query_only = ON")
+    else:
+        # Persistent in the database file; cheap once already set
+        conn.execute(f"PRAGMA journal_mode = {JOURNAL_MODE}")
+    return conn
+
+
+def _checkout(kind: str) -> PooledConnection:
+    pool = _thread_pool(kind)
+    conn = pool.pop() if pool else _open(read_only=(kind == "read"))
+    conn._pool = pool
     return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Returns a SQLite database connection (read/write).
+
+    - check_same_thread=False is required for FastAPI background tasks
+    - row_factory allows dict-like access to rows
+    - Connections are reused per thread: close() hands it back to the pool
+    """
+    return _checkout("write")
+
+
+def get_read_connection() -> sqlite3.Connection:
+    """
+    Returns a read-only SQLite connection (PRAGMA query_only) from the same
+    per-thread pool. With WAL, readers never wait for ingestion commits.
+    """
+    return _checkout("read")
@@ -1,10 +1,21 @@
 from database.db import get_connection
+from database.repository import (
+    DB_IDENTITY_KEY, bulk_load_running, rebuild_lab_aggregates, rebuild_report_rollups, restore_bulk_load_objects
+)
 
 
 def create_tables():
+    # A drop_indexes bulk load still running in another process keeps the
+    # lab_interpretations indexes / triggers dropped until it finishes
+    load_running = bulk_load_running()
+
     conn = get_connection()
     cursor = conn.cursor()
 
+    def create_lab_object(sql):
+        if not load_running:
+            cursor.execute(sql)
+
     # Main table
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS lab_interpretations (
@@ -18,31 +29,84 @@ def create_tables():
         status TEXT,
         reason TEXT,
         processed_time TEXT,
-        reviewed INTEGER DEFAULT 0
+        reviewed INTEGER DEFAULT 0,
+        processed_epoch INTEGER
     )
     """)
 
+    # processed_epoch: processed_time as integer UTC seconds, so time ranges
+    # and buckets don't depend on every writer using the same text format.
+    # Added in place for databases created before the column existed.
+    cursor.execute("PRAGMA table_info(lab_interpretations)")
+    if "processed_epoch" not in {row["name"] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE lab_interpretations ADD COLUMN processed_epoch INTEGER")
+        cursor.execute("""
+        UPDATE lab_interpretations
+        SET processed_epoch = CAST(strftime('%s', processed_time) AS INTEGER)
+        WHERE processed_time IS NOT NULL
+        """)
+
+    # Writers that don't go through INSERT_SQL still get an epoch
+    create_lab_object("""
+    CREATE TRIGGER IF NOT EXISTS trg_lab_processed_epoch
+    AFTER INSERT ON lab_interpretations
+    WHEN NEW.processed_epoch IS NULL AND NEW.processed_time IS NOT NULL
+    BEGIN
+        UPDATE lab_interpretations
+        SET processed_epoch = CAST(strftime('%s', NEW.processed_time) AS INTEGER)
+        WHERE id = NEW.id;
+    END
+    """)
+
     # Indexes for performance (VERY IMPORTANT)
-    cursor.execute("""
+    create_lab_object("""
     CREATE INDEX IF NOT EXISTS idx_lab_subject
     ON lab_interpretations (subject_id)
     """)
 
-    cursor.execute("""
+    create_lab_object("""
     CREATE INDEX IF NOT EXISTS idx_lab_status
     ON lab_interpretations (status)
     """)
 
-    cursor.execute("""
+    create_lab_object("""
     CREATE INDEX IF NOT EXISTS idx_lab_subject_status
     ON lab_interpretations (subject_id, status)
     """)
 
-    cursor.execute("""
+    create_lab_object("""
     CREATE INDEX IF NOT EXISTS idx_lab_time
     ON lab_interpretations (processed_time)
     """)
 
+    # Time-range scans per status (activity windows, histograms); covering,
+    # so bucket counts never touch the table rows
+    create_lab_object("""
+    CREATE INDEX IF NOT EXISTS idx_lab_status_epoch
+    ON lab_interpretations (status, processed_epoch)
+    """)
+
+    # Partial indexes over the unreviewed CRITICAL queue only: they stay as
+    # small as the backlog and serve keyset pages in (processed_time, id) order.
+    # Never dropped by bulk loads (the alert queries pin them)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_lab_unreviewed_critical
+    ON lab_interpretations (processed_time, id)
+    WHERE status = 'CRITICAL' AND reviewed = 0
+    """)
+
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_lab_unreviewed_critical_test
+    ON lab_interpretations (test_name, processed_time, id)
+    WHERE status = 'CRITICAL' AND reviewed = 0
+    """)
+
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_lab_unreviewed_critical_subject
+    ON lab_interpretations (subject_id, processed_time, id)
+    WHERE status = 'CRITICAL' AND reviewed = 0
+    """)
+
     # User table for authentication
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS users (
@@ -55,5 +119,251 @@ def create_tables():
     )
     """)
 
+    # Key/value bookkeeping (watermarks, versions) for derived tables
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS app_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    """)
+    cursor.execute(
+        "INSERT OR IGNORE INTO app_meta (key, value) VALUES (?, lower(hex(randomblob(16))))",
+        (DB_IDENTITY_KEY,)
+    )
+
+    # Resume points of long ingestion runs (input rows already committed)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+        load_id TEXT PRIMARY KEY,
+        rows_done INTEGER NOT NULL,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    # Materialized ML risk scores (one row per patient)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS patient_risk_scores (
+        subject_id INTEGER PRIMARY KEY,
+        risk_level INTEGER NOT NULL,
+        risk_label TEXT NOT NULL,
+        confidence REAL,
+        prob_normal REAL,
+        prob_abnormal REAL,
+        prob_critical REAL,
+        model_version TEXT,
+        scored_at TEXT,
+        data_watermark INTEGER
+    )
+    """)
+
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_risk_scores_level
+    ON patient_risk_scores (risk_level, confidence)
+    """)
+
+    # Running per-(patient, test) aggregates, maintained on insert
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS lab_aggregates (
+        subject_id INTEGER NOT NULL,
+        test_name TEXT NOT NULL,
+        last_value REAL,
+        last_change REAL,
+        min_value REAL,
+        max_value REAL,
+        value_count INTEGER NOT NULL DEFAULT 0,
+        sum_value REAL NOT NULL DEFAULT 0,
+        max_risk_level INTEGER NOT NULL DEFAULT 0,
+        last_id INTEGER,
+        last_time TEXT,
+        PRIMARY KEY (subject_id, test_name)
+    )
+    """)
+
+    create_lab_object("""
+    CREATE TRIGGER IF NOT EXISTS trg_lab_aggregates_insert
+    AFTER INSERT ON lab_interpretations
+    WHEN NEW.value IS NOT NULL
+    BEGIN
+        INSERT INTO lab_aggregates (
+            subject_id, test_name, last_value, last_change, min_value, max_value,
+            value_count, sum_value, max_risk_level, last_id, last_time
+        ) VALUES (
+            NEW.subject_id, NEW.test_name, NEW.value, NULL, NEW.value, NEW.value,
+            1, NEW.value,
+            CASE NEW.status WHEN 'CRITICAL' THEN 2 WHEN 'ABNORMAL' THEN 1 ELSE 0 END,
+            NEW.id, NEW.processed_time
+        )
+        ON CONFLICT (subject_id, test_name) DO UPDATE SET
+            last_change = NEW.value - last_value,
+            last_value = NEW.value,
+            min_value = MIN(min_value, NEW.value),
+            max_value = MAX(max_value, NEW.value),
+            value_count = value_count + 1,
+            sum_value = sum_value + NEW.value,
+            max_risk_level = MAX(max_risk_level,
+                CASE NEW.status WHEN 'CRITICAL' THEN 2 WHEN 'ABNORMAL' THEN 1 ELSE 0 END),
+            last_id = NEW.id,
+            last_time = NEW.processed_time;
+    END
+    """)
+
+    # Report rollups, maintained on insert so the dashboard reports read
+    # O(groups) rows instead of scanning lab_interpretations.
+    # NULL status counts as 'UNKNOWN' (as report_summary shows it), NULL
+    # gender is stored as '' (primary keys must compare equal).
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_status_counts (
+        status TEXT PRIMARY KEY,
+        lab_count INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+
+    # Distinct patients per (test, status) and (gender, status): membership
+    # rows dedupe patients, counts change only when a member is new
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_test_status_members (
+        test_name TEXT NOT NULL,
+        status TEXT NOT NULL,
+        subject_id INTEGER NOT NULL,
+        PRIMARY KEY (test_name, status, subject_id)
+    ) WITHOUT ROWID
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_test_status_counts (
+        test_name TEXT NOT NULL,
+        status TEXT NOT NULL,
+        patient_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (test_name, status)
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_gender_status_members (
+        gender TEXT NOT NULL,
+        status TEXT NOT NULL,
+        subject_id INTEGER NOT NULL,
+        PRIMARY KEY (gender, status, subject_id)
+    ) WITHOUT ROWID
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_gender_status_counts (
+        gender TEXT NOT NULL,
+        status TEXT NOT NULL,
+        patient_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (gender, status)
+    )
+    """)
+
+    # Per-patient max risk level (0 normal, 1 abnormal, 2 critical) and
+    # the number of patients at each level
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_patient_max_risk (
+        subject_id INTEGER PRIMARY KEY,
+        risk_level INTEGER NOT NULL
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_risk_level_counts (
+        risk_level INTEGER PRIMARY KEY,
+        patient_count INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+
+    create_lab_object("""
+    CREATE TRIGGER IF NOT EXISTS trg_rollups_lab_insert
+    AFTER INSERT ON lab_interpretations
+    BEGIN
+        INSERT INTO rollup_status_counts (status, lab_count)
+        VALUES (IFNULL(NEW.status, 'UNKNOWN'), 1)
+        ON CONFLICT (status) DO UPDATE SET lab_count = lab_count + 1;
+
+        INSERT OR IGNORE INTO rollup_test_status_members (test_name, status, subject_id)
+        SELECT NEW.test_name, NEW.status, NEW.subject_id
+        WHERE NEW.status IN ('ABNORMAL', 'CRITICAL');
+
+        INSERT OR IGNORE INTO rollup_gender_status_members (gender, status, subject_id)
+        SELECT IFNULL(NEW.gender, ''), NEW.status, NEW.subject_id
+        WHERE NEW.status IN ('ABNORMAL', 'CRITICAL');
+
+        INSERT INTO rollup_patient_max_risk (subject_id, risk_level)
+        VALUES (
+            NEW.subject_id,
+            CASE NEW.status WHEN 'CRITICAL' THEN 2 WHEN 'ABNORMAL' THEN 1 ELSE 0 END
+        )
+        ON CONFLICT (subject_id) DO UPDATE SET risk_level = excluded.risk_level
+        WHERE excluded.risk_level > risk_level;
+    END
+    """)
+
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_rollup_test_member_insert
+    AFTER INSERT ON rollup_test_status_members
+    BEGIN
+        INSERT INTO rollup_test_status_counts (test_name, status, patient_count)
+        VALUES (NEW.test_name, NEW.status, 1)
+        ON CONFLICT (test_name, status) DO UPDATE SET patient_count = patient_count + 1;
+    END
+    """)
+
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_rollup_gender_member_insert
+    AFTER INSERT ON rollup_gender_status_members
+    BEGIN
+        INSERT INTO rollup_gender_status_counts (gender, status, patient_count)
+        VALUES (NEW.gender, NEW.status, 1)
+        ON CONFLICT (gender, status) DO UPDATE SET patient_count = patient_count + 1;
+    END
+    """)
+
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_rollup_max_risk_insert
+    AFTER INSERT ON rollup_patient_max_risk
+    BEGIN
+        INSERT INTO rollup_risk_level_counts (risk_level, patient_count)
+        VALUES (NEW.risk_level, 1)
+        ON CONFLICT (risk_level) DO UPDATE SET patient_count = patient_count + 1;
+    END
+    """)
+
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_rollup_max_risk_update
+    AFTER UPDATE OF risk_level ON rollup_patient_max_risk
+    WHEN NEW.risk_level != OLD.risk_level
+    BEGIN
+        UPDATE rollup_risk_level_counts
+        SET patient_count = patient_count - 1
+        WHERE risk_level = OLD.risk_level;
+
+        INSERT INTO rollup_risk_level_counts (risk_level, patient_count)
+        VALUES (NEW.risk_level, 1)
+        ON CONFLICT (risk_level) DO UPDATE SET patient_count = patient_count + 1;
+    END
+    """)
+
     conn.commit()
+
+    # Backfill derived tables for rows inserted before the triggers existed
+    cursor.execute("""
+        SELECT
+            EXISTS (SELECT 1 FROM lab_aggregates) AS has_aggregates,
+            EXISTS (SELECT 1 FROM rollup_status_counts) AS has_rollups
+    """)
+    row = cursor.fetchone()
     conn.close()
+
+    if load_running:
+        # The load rebuilds the derived tables itself when it is done
+        return
+
+    # A bulk load killed mid-way (drop_indexes=True) leaves its indexes /
+    # triggers recorded in app_meta: restore them and rebuild what they maintain
+    if restore_bulk_load_objects():
+        return
+
+    if not row["has_aggregates"]:
+        rebuild_lab_aggregates()
+    if not row["has_rollups"]:
+        rebuild_report_rollups()
@@ -1,8 +1,21 @@
-from database.db import get_connection
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from database.db import CACHE_SIZE_KB, DB_PATH, SYNCHRONOUS, get_connection, get_read_connection
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, a running load can't be told from a dead one
+    fcntl = None
 
 
 # ---------------- INSERTS ----------------
 
+# processed_epoch (UTC seconds) is derived from processed_time (?9) in SQL,
+# so records keep their 10-field shape
 INSERT_SQL = """
 INSERT INTO lab_interpretations (
     subject_id,
@@ -14,24 +27,127 @@ INSERT INTO lab_interpretations (
     status,
     reason,
     processed_time,
-    reviewed
-) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    reviewed,
+    processed_epoch
+) VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10, CAST(strftime('%s', ?9) AS INTEGER))
 """
 
 
-def insert_lab_results_bulk(records: list[tuple]):
+# ---------------- DATA VERSION ----------------
+# Monotonic counter in app_meta, bumped by every write to lab_interpretations
+# made through this module (inserts, clears, review updates) and by every
+# refresh of the materialized risk scores. Caches compare it instead of expiring on a timer.
+# Writers outside this module must call bump_data_version() themselves.
+
+DATA_VERSION_KEY = "data_version"
+
+# Random token written once per database file by create_tables, so state kept
+# outside the file (e.g. the feature store) notices a replaced database
+DB_IDENTITY_KEY = "db_identity"
+
+# Last value read by get_data_version: [read_at (monotonic), version]
+_version_memo = [0.0, 0]
+
+
+def bump_data_version(cursor=None):
+    """Increment the lab data version (optionally inside the caller's transaction)"""
+    # Local writers never see a memoized pre-write version
+    _version_memo[0] = 0.0
+    conn = None
+    if cursor is None:
+        conn = get_connection()
+        cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO app_meta (key, value) VALUES (?, '1')
+        ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+    """, (DATA_VERSION_KEY,))
+    if conn is not None:
+        conn.close()
+
+
+def get_data_version(max_age: float = 0.0) -> int:
+    """
+    Current lab data version (primary-key lookup).
+    max_age > 0 allows a value read up to max_age seconds ago, without a
+    query; writes by other processes then show up after at most max_age.
+    """
+    now = time.monotonic()
+    if max_age and now - _version_memo[0] < max_age:
+        return _version_memo[1]
+
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT value FROM app_meta WHERE key = ?", (DATA_VERSION_KEY,))
+    row = cursor.fetchone()
+    conn.close()
+
+    version = int(row["value"]) if row else 0
+    _version_memo[0], _version_memo[1] = now, version
+    return version
+
+
+# Callbacks run after every successful bulk insert (e.g. risk rescoring)
+_insert_listeners = []
+
+
+def add_insert_listener(callback):
+    """
+    Register a no-argument callback fired after insert_lab_results_bulk commits.
+    Listeners must be cheap (signal a worker, don't do the work inline).
+    """
+    if callback not in _insert_listeners:
+        _insert_listeners.append(callback)
+
+
+def _notify_insert_listeners():
+    for callback in _insert_listeners:
+        try:
+            callback()
+        except Exception as e:
+            print(f"Insert listener {callback} failed: {e}")
+
+
+def insert_lab_results_bulk(records: list[tuple], conn=None, checkpoint: tuple = None):
     """
     Bulk insert lab interpretations.
     Used during ingestion / preprocessing (FAST).
+
+    The batch is one explicit transaction (all rows or none).
+    conn: connection to write on (e.g. from bulk_load()); default: a pooled writer
+    checkpoint: (load_id, rows_done) recorded in the same transaction, so a
+    resumed load skips exactly the input that is committed
     """
-    if not records:
+    if not records and checkpoint is None:
         return
 
-    conn = get_connection()
+    own_conn = conn is None
+    if own_conn:
+        conn = get_connection()
     cursor = conn.cursor()
-    cursor.executemany(INSERT_SQL, records)
-    conn.commit()
-    conn.close()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        if records:
+            cursor.executemany(INSERT_SQL, records)
+            bump_data_version(cursor)
+        if checkpoint is not None:
+            cursor.execute("""
+                INSERT INTO ingest_checkpoints (load_id, rows_done, updated_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(load_id) DO UPDATE SET
+                    rows_done = excluded.rows_done,
+                    updated_at = excluded.updated_at
+            """, checkpoint)
+        cursor.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+
+    if records:
+        _notify_insert_listeners()
 
 
 def clear_lab_interpretations():
@@ -43,10 +159,475 @@ def clear_lab_interpretations():
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("DELETE FROM lab_interpretations")
+    cursor.execute("DELETE FROM lab_aggregates")
+    _clear_report_rollups(cursor)
+    # Stored predictions would outlive their lab rows; dropping
+    # risk_score_service's watermark / model version makes the next
+    # refresh a full rebuild
+    cursor.execute("DELETE FROM patient_risk_scores")
+    cursor.execute("DELETE FROM app_meta WHERE key LIKE 'risk_scores.%'")
+    bump_data_version(cursor)
     conn.commit()
     conn.close()
 
 
+# ---------------- ALERT REVIEW ----------------
+
+# Ids per UPDATE statement when acknowledging by id list
+REVIEW_BATCH_SIZE = 5000
+
+
+def mark_critical_reviewed(ids=None, subject_id: int = None, test_name: str = None,
+                           processed_before_epoch: int = None) -> int:
+    """
+    Mark unreviewed CRITICAL labs as reviewed, in one transaction.
+
+    Select rows by an id list, and/or by subject, test and processed_epoch
+    (<= processed_before_epoch, UTC seconds). At least one criterion is required.
+    Returns: number of rows newly marked reviewed
+    """
+    filters = ["status = 'CRITICAL'", "reviewed = 0"]
+    params = []
+    if subject_id is not None:
+        filters.append("subject_id = ?")
+        params.append(subject_id)
+    if test_name is not None:
+        filters.append("test_name = ?")
+        params.append(test_name)
+    if processed_before_epoch is not None:
+        filters.append("processed_epoch <= ?")
+        params.append(processed_before_epoch)
+
+    if ids is None and not params:
+        raise ValueError("Refusing to review every alert: give ids or a filter")
+
+    where = " AND ".join(filters)
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        updated = 0
+        if ids is None:
+            cursor.execute(f"UPDATE lab_interpretations SET reviewed = 1 WHERE {where}", params)
+            updated = cursor.rowcount
+        else:
+            ids = [int(i) for i in ids]
+            for start in range(0, len(ids), REVIEW_BATCH_SIZE):
+                batch = json.dumps(ids[start:start + REVIEW_BATCH_SIZE])
+                cursor.execute(f"""
+                UPDATE lab_interpretations SET reviewed = 1
+                WHERE id IN (SELECT value FROM json_each(?))
+                  AND {where}
+                """, [batch] + params)
+                updated += cursor.rowcount
+
+        if updated:
+            bump_data_version(cursor)
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    return updated
+
+
+# ---------------- BULK LOAD ----------------
+# Settings for long ingestion runs. synchronous=OFF skips fsync: an
+# application crash is still safe (committed batches + checkpoint survive),
+# but an OS crash / power loss during the load can lose or damage recent
+# writes - reload from a backup in that case.
+
+BULK_CACHE_SIZE_KB = 262144
+# WAL pages between automatic checkpoints while loading (default 1000)
+BULK_WAL_AUTOCHECKPOINT = 10000
+
+# app_meta key holding the indexes / triggers dropped by an unfinished load
+DROPPED_OBJECTS_KEY = "bulk_load_dropped_objects"
+
+# Kept during drop_indexes loads: the alert queries pin them with INDEXED BY
+# (an error if they are missing), and as partial indexes over the unreviewed
+# CRITICAL rows they cost little per insert
+KEPT_LOAD_INDEXES = (
+    "idx_lab_unreviewed_critical",
+    "idx_lab_unreviewed_critical_test",
+    "idx_lab_unreviewed_critical_subject",
+)
+
+# Held (flock) by the process running a drop_indexes load, for its whole
+# duration; the OS releases it when that process dies, however it dies
+LOADER_LOCK_PATH = f"{DB_PATH}.bulk-load.lock"
+
+
+def get_ingest_checkpoint(load_id: str) -> int:
+    """Input rows already committed by load_id (0 if it never ran)"""
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT rows_done FROM ingest_checkpoints WHERE load_id = ?", (load_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return row["rows_done"] if row else 0
+
+
+def clear_ingest_checkpoint(load_id: str):
+    """Forget a load's progress (the next run with this id starts over)"""
+    conn = get_connection()
+    conn.execute("DELETE FROM ingest_checkpoints WHERE load_id = ?", (load_id,))
+    conn.close()
+
+
+def _drop_load_objects(cursor):
+    # Saved before dropping, so an interrupted load still knows what to rebuild
+    cursor.execute("""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND tbl_name = 'lab_interpretations'
+          AND sql IS NOT NULL
+    """)
+    objects = {
+        r["name"]: {"type": r["type"], "sql": r["sql"]}
+        for r in cursor.fetchall() if r["name"] not in KEPT_LOAD_INDEXES
+    }
+    cursor.execute("SELECT value FROM app_meta WHERE key = ?", (DROPPED_OBJECTS_KEY,))
+    row = cursor.fetchone()
+    saved = json.loads(row["value"]) if row else {}
+    saved.update(objects)
+
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("""
+        INSERT INTO app_meta (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    """, (DROPPED_OBJECTS_KEY, json.dumps(saved)))
+    for name, obj in objects.items():
+        cursor.execute(f'DROP {obj["type"].upper()} IF EXISTS "{name}"')
+    cursor.execute("COMMIT")
+    return objects
+
+
+def _restore_load_objects(cursor):
+    cursor.execute("SELECT value FROM app_meta WHERE key = ?", (DROPPED_OBJECTS_KEY,))
+    row = cursor.fetchone()
+    if not row:
+        return {}
+    saved = json.loads(row["value"])
+
+    cursor.execute("BEGIN IMMEDIATE")
+    for obj in saved.values():
+        create = f"CREATE {obj['type'].upper()}"
+        cursor.execute(obj["sql"].replace(create, f"{create} IF NOT EXISTS", 1))
+    if any(obj["type"] == "trigger" for obj in saved.values()):
+        # What trg_lab_processed_epoch would have done for other writers
+        cursor.execute("""
+            UPDATE lab_interpretations
+            SET processed_epoch = CAST(strftime('%s', processed_time) AS INTEGER)
+            WHERE processed_epoch IS NULL AND processed_time IS NOT NULL
+        """)
+    cursor.execute("DELETE FROM app_meta WHERE key = ?", (DROPPED_OBJECTS_KEY,))
+    cursor.execute("COMMIT")
+    return saved
+
+
+def _try_loader_lock():
+    """Open file holding the loader lock, or None if a live load holds it"""
+    f = open(LOADER_LOCK_PATH, "a+")
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return None
+    return f
+
+
+def _loader_pid():
+    try:
+        with open(LOADER_LOCK_PATH) as f:
+            return f.read().strip() or "?"
+    except FileNotFoundError:
+        return "?"
+
+
+def _restore_and_rebuild():
+    conn = get_connection()
+    try:
+        restored = _restore_load_objects(conn.cursor())
+    finally:
+        conn.close()
+
+    if any(obj["type"] == "trigger" for obj in restored.values()):
+        # Triggers are back first, so rows inserted from here on are
+        # counted by them and the rebuilds cover everything before
+        rebuild_lab_aggregates()
+        rebuild_report_rollups()
+    return restored
+
+
+def _load_objects_pending() -> bool:
+    conn = get_read_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM app_meta WHERE key = ?", (DROPPED_OBJECTS_KEY,))
+        return cursor.fetchone() is not None
+    except sqlite3.OperationalError:
+        # app_meta not created yet
+        return False
+    finally:
+        conn.close()
+
+
+def bulk_load_running() -> bool:
+    """True while a drop_indexes bulk_load (any process) has its objects dropped"""
+    if not _load_objects_pending():
+        return False
+    lock = _try_loader_lock()
+    if lock is None:
+        return True
+    lock.close()
+    return False
+
+
+def restore_bulk_load_objects():
+    """
+    Recreate indexes / triggers left dropped by an interrupted bulk_load
+    (e.g. after a hard kill) and, if triggers were missing, rebuild the
+    tables they maintain. No-op when nothing is pending or when the load
+    that dropped them is still running.
+    """
+    if not _load_objects_pending():
+        return {}
+
+    lock = _try_loader_lock()
+    if lock is None:
+        print(f"⏳ Bulk load in progress (pid {_loader_pid()}): "
+              f"its indexes / triggers are restored when it finishes")
+        return {}
+    try:
+        return _restore_and_rebuild()
+    finally:
+        lock.close()
+
+
+@contextmanager
+def bulk_load(drop_indexes: bool = False):
+    """
+    Writer connection tuned for large loads; pass it to insert_lab_results_bulk.
+
+    - synchronous=OFF, a larger page cache and fewer WAL checkpoints
+    - drop_indexes: drop the secondary indexes (except KEPT_LOAD_INDEXES)
+      and the per-row triggers on lab_interpretations (lab_aggregates,
+      report rollups, processed_epoch) for the load; at the end (also after an error) recreate them and
+      rebuild lab_aggregates and the rollups once. The loader lock is held
+      meanwhile: after a hard kill, create_tables does the restore, but
+      never while the load is alive. One drop_indexes load at a time.
+    Settings are restored before the connection goes back to the pool.
+    """
+    lock = None
+    if drop_indexes:
+        lock = _try_loader_lock()
+        if lock is None:
+            raise RuntimeError(f"Another drop_indexes bulk load is running (pid {_loader_pid()})")
+        lock.truncate(0)
+        lock.write(str(os.getpid()))
+        lock.flush()
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("PRAGMA synchronous = OFF")
+        cursor.execute(f"PRAGMA cache_size = {-BULK_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA wal_autocheckpoint = {BULK_WAL_AUTOCHECKPOINT}")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+
+        if drop_indexes:
+            dropped = _drop_load_objects(cursor)
+            n_triggers = sum(obj["type"] == "trigger" for obj in dropped.values())
+            print(f"✓ Bulk load: dropped {len(dropped) - n_triggers} indexes "
+                  f"and {n_triggers} triggers")
+
+        yield conn
+    finally:
+        try:
+            if conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            if drop_indexes:
+                start = time.perf_counter()
+                restored = _restore_and_rebuild()
+                print(f"✓ Bulk load: restored {len(restored)} indexes / triggers and "
+                      f"rebuilt derived tables in {time.perf_counter() - start:.1f}s")
+        finally:
+            cursor.execute(f"PRAGMA synchronous = {SYNCHRONOUS}")
+            cursor.execute(f"PRAGMA cache_size = {-CACHE_SIZE_KB}")
+            cursor.execute("PRAGMA wal_autocheckpoint = 1000")
+            cursor.execute("PRAGMA temp_store = DEFAULT")
+            conn.close()
+            if lock is not None:
+                lock.close()
+
+
+# ---------------- ROLLING LAB AGGREGATES ----------------
+
+def rebuild_lab_aggregates():
+    """
+    Recompute lab_aggregates from scratch (one window-function pass).
+    Normally the insert trigger keeps it current; this is for backfills.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+    cursor.execute("DELETE FROM lab_aggregates")
+    cursor.execute("""
+    INSERT INTO lab_aggregates (
+        subject_id, test_name, last_value, last_change, min_value, max_value,
+        value_count, sum_value, max_risk_level, last_id, last_time
+    )
+    SELECT
+        subject_id, test_name, value, value - prev_value, min_value, max_value,
+        value_count, sum_value, max_risk_level, id, processed_time
+    FROM (
+        SELECT
+            subject_id,
+            test_name,
+            value,
+            id,
+            processed_time,
+            LAG(value) OVER by_id AS prev_value,
+            ROW_NUMBER() OVER (PARTITION BY subject_id, test_name ORDER BY id DESC) AS rn,
+            MIN(value) OVER grp AS min_value,
+            MAX(value) OVER grp AS max_value,
+            COUNT(*) OVER grp AS value_count,
+            SUM(value) OVER grp AS sum_value,
+            MAX(CASE status WHEN 'CRITICAL' THEN 2 WHEN 'ABNORMAL' THEN 1 ELSE 0 END) OVER grp
+                AS max_risk_level
+        FROM lab_interpretations
+        WHERE value IS NOT NULL
+        WINDOW by_id AS (PARTITION BY subject_id, test_name ORDER BY id),
+               grp AS (PARTITION BY subject_id, test_name)
+    )
+    WHERE rn = 1
+    """)
+    # Cached reports / ETags are keyed on the data version
+    bump_data_version(cursor)
+    cursor.execute("COMMIT")
+    conn.close()
+
+
+# ---------------- REPORT ROLLUPS ----------------
+
+ROLLUP_TABLES = (
+    "rollup_status_counts",
+    "rollup_test_status_members",
+    "rollup_test_status_counts",
+    "rollup_gender_status_members",
+    "rollup_gender_status_counts",
+    "rollup_patient_max_risk",
+    "rollup_risk_level_counts",
+)
+
+
+def _clear_report_rollups(cursor):
+    for table in ROLLUP_TABLES:
+        cursor.execute(f"DELETE FROM {table}")
+
+
+def rebuild_report_rollups():
+    """
+    Recompute the report rollup tables from lab_interpretations.
+    Normally the insert triggers keep them current; this is for backfills.
+    Membership rows are inserted first, so their triggers fill the counts.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+    _clear_report_rollups(cursor)
+
+    cursor.execute("""
+    INSERT INTO rollup_status_counts (status, lab_count)
+    SELECT IFNULL(status, 'UNKNOWN'), COUNT(*)
+    FROM lab_interpretations
+    GROUP BY IFNULL(status, 'UNKNOWN')
+    """)
+    cursor.execute("""
+    INSERT INTO rollup_test_status_members (test_name, status, subject_id)
+    SELECT DISTINCT test_name, status, subject_id
+    FROM lab_interpretations
+    WHERE status IN ('ABNORMAL', 'CRITICAL')
+    """)
+    cursor.execute("""
+    INSERT INTO rollup_gender_status_members (gender, status, subject_id)
+    SELECT DISTINCT IFNULL(gender, ''), status, subject_id
+    FROM lab_interpretations
+    WHERE status IN ('ABNORMAL', 'CRITICAL')
+    """)
+    cursor.execute("""
+    INSERT INTO rollup_patient_max_risk (subject_id, risk_level)
+    SELECT
+        subject_id,
+        MAX(CASE status WHEN 'CRITICAL' THEN 2 WHEN 'ABNORMAL' THEN 1 ELSE 0 END)
+    FROM lab_interpretations
+    GROUP BY subject_id
+    """)
+    bump_data_version(cursor)
+    cursor.execute("COMMIT")
+    conn.close()
+
+
+AGGREGATE_COLUMNS = """
+    subject_id,
+    test_name,
+    last_value,
+    last_change,
+    min_value,
+    max_value,
+    value_count,
+    sum_value * 1.0 / value_count AS mean_value,
+    max_risk_level,
+    last_time
+"""
+
+
+def get_lab_aggregates_by_subject(subject_id: int):
+    """
+    Running aggregates for every test of one patient (primary-key lookup,
+    no scan over the patient's lab history).
+    """
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+    SELECT {AGGREGATE_COLUMNS}
+    FROM lab_aggregates
+    WHERE subject_id = ?
+    ORDER BY test_name
+    """, (subject_id,))
+    rows = [dict(r) for r in cursor.fetchall()]
+    conn.close()
+    return rows
+
+
+def get_lab_aggregates(subject_ids=None):
+    """
+    Aggregate rows for many patients in one query (None = all patients),
+    ordered by subject_id.
+    """
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    if subject_ids is None:
+        cursor.execute(f"""
+        SELECT {AGGREGATE_COLUMNS}
+        FROM lab_aggregates
+        ORDER BY subject_id
+        """)
+    else:
+        cursor.execute(f"""
+        SELECT {AGGREGATE_COLUMNS}
+        FROM lab_aggregates
+        WHERE subject_id IN (SELECT value FROM json_each(?))
+        ORDER BY subject_id
+        """, (json.dumps([int(s) for s in subject_ids]),))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+
 # ---------------- AI SUPPORT QUERIES ----------------
 
 def get_abnormal_labs_by_subject(subject_id: int, limit: int = 5):
@@ -71,7 +652,7 @@ def get_abnormal_labs_by_subject(subject_id: int, limit: int = 5):
     LIMIT ?
     """
 
-    conn = get_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     cursor.execute(query, (subject_id, limit))
     rows = cursor.fetchall()
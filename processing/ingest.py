@@ -0,0 +1,203 @@
+"""
+Streaming labevents ingestion
+labevents.csv is read in fixed-size chunks with compact dtypes; each chunk is
+validated, joined with the dimension tables, interpreted and written with
+insert_lab_results_bulk, so memory is bounded by the chunk size rather than
+the file (MIMIC-IV labevents is 100M+ rows). Writes use bulk_load(): one
+transaction per chunk, checkpointed so an interrupted load can resume.
+
+Stages are plain functions (chunk in, chunk / records out) so they can be
+reused by other drivers.
+"""
+
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from processing.parser import iter_csv_chunks, load_csv
+from processing.schema import ADMISSIONS_SCHEMA, DLABITEMS_SCHEMA, LABEVENTS_SCHEMA, PATIENTS_SCHEMA
+from processing.validator import validate_schema
+from processing.joins import attach_dimensions, index_dimensions
+from processing.lab_canonical_map import LAB_CANONICAL_MAP
+from processing.lab_rules import interpret_labs
+from database.repository import bulk_load, get_ingest_checkpoint, insert_lab_results_bulk
+
+# Rows per labevents chunk (~25 bytes/row in memory with the dtypes below)
+DEFAULT_CHUNK_SIZE = 500_000
+
+# Compact dtypes: ids as 32-bit ints (hadm_id is nullable), units as categories
+LABEVENTS_DTYPES = {
+    "subject_id": "int32",
+    "hadm_id": "Int32",
+    "itemid": "int32",
+    "valuenum": "float64",
+    "valueuom": "category"
+}
+
+# Columns actually parsed: the header is still checked against the full
+# LABEVENTS_SCHEMA, but charttime is never used downstream (and as Python
+# strings it would be the costliest column per row)
+LABEVENTS_COLUMNS = sorted(LABEVENTS_DTYPES)
+
+DLABITEMS_DTYPES = {"itemid": "int32", "label": "object"}
+PATIENTS_DTYPES = {"subject_id": "int32", "gender": "category", "anchor_age": "int16"}
+ADMISSIONS_DTYPES = {"hadm_id": "int32", "subject_id": "int32", "admittime": "object", "dischtime": "object"}
+
+
+# =====================================================
+# INPUT
+# =====================================================
+
+def find_table(mimic_dir: str, name: str) -> str:
+    """Path of a MIMIC table as .csv or .csv.gz (hosp/ layout or flat)"""
+    for folder in (os.path.join(mimic_dir, "hosp"), mimic_dir):
+        for ext in (".csv", ".csv.gz"):
+            path = os.path.join(folder, name + ext)
+            if os.path.exists(path):
+                return path
+    raise FileNotFoundError(f"{name}.csv(.gz) not found under {mimic_dir}")
+
+
+def load_dimensions(mimic_dir: str):
+    """
+    d_labitems, patients and admissions (small; loaded whole, needed columns
+    only), indexed for attach_dimensions
+    """
+    tables = []
+    for name, schema, dtypes in (
+        ("d_labitems", DLABITEMS_SCHEMA, DLABITEMS_DTYPES),
+        ("patients", PATIENTS_SCHEMA, PATIENTS_DTYPES),
+        ("admissions", ADMISSIONS_SCHEMA, ADMISSIONS_DTYPES),
+    ):
+        df = load_csv(find_table(mimic_dir, name), usecols=sorted(schema), dtype=dtypes)
+        validate_schema(df, schema, name)
+        tables.append(df)
+    return index_dimensions(*tables)
+
+
+def iter_labevent_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, skip_rows: int = 0):
+    """
+    labevents in validated chunks of at most chunk_size rows,
+    starting after the first skip_rows data rows (resumed loads)
+    """
+    header = load_csv(path, nrows=0)
+    validate_schema(header, LABEVENTS_SCHEMA, "labevents")
+
+    # A callable, not range(): pandas would materialize a set of every
+    # skipped row number (GBs for a late resume point)
+    skip = (lambda i: 0 < i <= skip_rows) if skip_rows else None
+
+    for chunk in iter_csv_chunks(path, chunk_size,
+                                 usecols=LABEVENTS_COLUMNS, dtype=LABEVENTS_DTYPES,
+                                 skiprows=skip):
+        validate_schema(chunk, set(LABEVENTS_COLUMNS), "labevents")
+        yield chunk
+
+
+# =====================================================
+# TRANSFORM
+# =====================================================
+
+def select_supported_labs(df: pd.DataFrame) -> pd.DataFrame:
+    """Keep numeric results of mapped tests; test_name becomes the canonical name"""
+    labels = df["test_name"].astype("category")  # no-op after attach_dimensions
+    # Map each distinct label once, then carry category codes per row
+    canonical = pd.Categorical(labels.cat.categories.map(LAB_CANONICAL_MAP))
+    codes = np.append(canonical.codes, -1)[labels.cat.codes.to_numpy()]
+
+    keep = (codes >= 0) & df["valuenum"].notna().to_numpy()
+    return df.loc[keep].assign(
+        test_name=pd.Categorical.from_codes(codes[keep], dtype=canonical.dtype)
+    )
+
+
+def _nullable(series: pd.Series) -> np.ndarray:
+    # Object array with None for missing values (what sqlite3 can bind)
+    values = series.to_numpy(dtype=object, copy=True)
+    values[series.isna().to_numpy()] = None
+    return values
+
+
+def to_records(df: pd.DataFrame, processed_time: str) -> list[tuple]:
+    """Rows in insert_lab_results_bulk / INSERT_SQL column order"""
+    n = len(df)
+    return list(zip(
+        df["subject_id"].astype("int64").tolist(),
+        _nullable(df["hadm_id"]),
+        df["test_name"].tolist(),
+        df["valuenum"].tolist(),
+        _nullable(df["valueuom"]),
+        _nullable(df["gender"]),
+        df["status"].tolist(),
+        df["reason"].tolist(),
+        [processed_time] * n,
+        [0] * n
+    ))
+
+
+def process_chunk(chunk: pd.DataFrame, dimensions, interpret=interpret_labs) -> list[tuple]:
+    """join -> select -> interpret -> records, for one validated labevents chunk"""
+    joined = attach_dimensions(chunk, dimensions)
+    labs = interpret(select_supported_labs(joined))
+    return to_records(labs, datetime.utcnow().isoformat())
+
+
+# =====================================================
+# DRIVER
+# =====================================================
+
+def ingest_labevents(mimic_dir: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     limit_rows: int = None, interpret=interpret_labs,
+                     load_id: str = None, drop_indexes: bool = False):
+    """
+    Stream labevents into lab_interpretations (bulk-load mode, one
+    transaction per chunk).
+    limit_rows stops after that many input rows this run (trial runs).
+    load_id: checkpoint progress under this id; a rerun with the same id
+    resumes after the last committed chunk.
+    drop_indexes: rebuild secondary indexes, lab_aggregates and the report
+    rollups once at the end instead of maintaining them per row (worth it
+    for very large loads).
+    Returns: {'rows_read', 'rows_written', 'chunks', 'seconds', 'rows_per_second',
+              'resumed_from'}
+    """
+    labevents_path = find_table(mimic_dir, "labevents")
+    dimensions = load_dimensions(mimic_dir)
+    rows_done = get_ingest_checkpoint(load_id) if load_id else 0
+    print(f"✓ Dimension tables loaded; streaming {labevents_path} in chunks of {chunk_size:,}")
+    if rows_done:
+        print(f"↻ Resuming load '{load_id}' after {rows_done:,} rows")
+
+    start = time.perf_counter()
+    rows_read = rows_written = chunks = 0
+
+    with bulk_load(drop_indexes) as conn:
+        for chunk in iter_labevent_chunks(labevents_path, chunk_size, skip_rows=rows_done):
+            if limit_rows is not None:
+                chunk = chunk.iloc[:max(0, limit_rows - rows_read)]
+                if chunk.empty:
+                    break
+
+            records = process_chunk(chunk, dimensions, interpret)
+            rows_read += len(chunk)
+            checkpoint = (load_id, rows_done + rows_read) if load_id else None
+            insert_lab_results_bulk(records, conn=conn, checkpoint=checkpoint)
+
+            chunks += 1
+            rows_written += len(records)
+            elapsed = time.perf_counter() - start
+            print(f"  chunk {chunks}: {rows_read:,} read, {rows_written:,} written "
+                  f"({rows_read / elapsed:,.0f} rows/s)")
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows_read": rows_read,
+        "rows_written": rows_written,
+        "chunks": chunks,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(rows_read / elapsed) if elapsed else 0,
+        "resumed_from": rows_done
+    }
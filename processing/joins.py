@@ -1,40 +1,107 @@
+"""
+Lab / dimension joins
+d_labitems, patients and admissions are indexed once (key -> row position),
+and each labevents chunk gets test name, gender, age and admission times by
+positional take. Unlike successive merges, no full-size intermediate frame
+is built and the labevents columns are not copied.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
 import pandas as pd
 
-def join_labevents_with_metadata(
-    labevents: pd.DataFrame,
+
+@dataclass(frozen=True)
+class DimensionIndex:
+    """Key indexes and attribute arrays of the dimension tables"""
+    itemids: pd.Index
+    test_names: pd.Categorical
+    subject_ids: pd.Index
+    genders: pd.Categorical
+    ages: np.ndarray
+    hadm_ids: pd.Index
+    admittimes: np.ndarray
+    dischtimes: np.ndarray
+
+
+def _unique_by(df: pd.DataFrame, key: str) -> pd.DataFrame:
+    # merge would fan out on duplicate keys; the lookup keeps the first row
+    return df.drop_duplicates(key) if df[key].duplicated().any() else df
+
+
+def index_dimensions(
     d_labitems: pd.DataFrame,
     patients: pd.DataFrame,
     admissions: pd.DataFrame
-) -> pd.DataFrame:
-    """
-    Core joins to create a patient- and visit-aware lab dataset.
-    """
+) -> DimensionIndex:
+    """Build the lookup once per ingestion run (dimension tables are small)"""
+    d_labitems = _unique_by(d_labitems, "itemid")
+    patients = _unique_by(patients, "subject_id")
+    admissions = _unique_by(admissions, "hadm_id")
 
-    # Join lab names
-    df = labevents.merge(
-        d_labitems[["itemid", "label"]],
-        on="itemid",
-        how="left"
+    return DimensionIndex(
+        itemids=pd.Index(d_labitems["itemid"].to_numpy()),
+        # Categorical: per-row cost is an int code, and later .map() calls
+        # (e.g. LAB_CANONICAL_MAP) run once per distinct label
+        test_names=pd.Categorical(d_labitems["label"]),
+        subject_ids=pd.Index(patients["subject_id"].to_numpy()),
+        genders=pd.Categorical(patients["gender"]),
+        ages=patients["anchor_age"].to_numpy(dtype=np.float64, na_value=np.nan),
+        hadm_ids=pd.Index(admissions["hadm_id"].to_numpy()),
+        # datetime64: the per-row take is an int64 gather, not Python objects
+        admittimes=pd.to_datetime(admissions["admittime"], errors="coerce").to_numpy(),
+        dischtimes=pd.to_datetime(admissions["dischtime"], errors="coerce").to_numpy()
     )
 
-    # Join patient demographics
-    df = df.merge(
-        patients[["subject_id", "gender", "anchor_age"]],
-        on="subject_id",
-        how="left"
-    )
 
-    # Join admission context
-    df = df.merge(
-        admissions[["hadm_id", "admittime", "dischtime"]],
-        on="hadm_id",
-        how="left"
-    )
+def _positions(index: pd.Index, keys: pd.Series) -> np.ndarray:
+    """Row position of each key in the dimension (-1 = no match / missing key)"""
+    if keys.hasnans:
+        pos = np.full(len(keys), -1, dtype=np.intp)
+        present = keys.notna().to_numpy()
+        pos[present] = index.get_indexer(keys[present].to_numpy(dtype=np.int64))
+        return pos
+    return index.get_indexer(keys.to_numpy())
+
+
+def _take_categorical(values: pd.Categorical, pos: np.ndarray) -> pd.Categorical:
+    codes = np.append(values.codes, -1)[pos]  # pos -1 -> trailing -1 (NaN)
+    return pd.Categorical.from_codes(codes, dtype=values.dtype)
 
-    # Rename for clarity
-    df = df.rename(columns={
-        "label": "test_name",
-        "anchor_age": "age"
-    })
 
+def _take(values: np.ndarray, pos: np.ndarray, missing) -> np.ndarray:
+    return np.append(values, np.array([missing], dtype=values.dtype))[pos]
+
+
+def attach_dimensions(labevents: pd.DataFrame, index: DimensionIndex) -> pd.DataFrame:
+    """
+    Left-join semantics of join_labevents_with_metadata without merges:
+    adds test_name, gender, age, admittime and dischtime to a labevents chunk
+    (test_name / gender as categoricals, admission times as datetime64).
+    """
+    item_pos = _positions(index.itemids, labevents["itemid"])
+    subject_pos = _positions(index.subject_ids, labevents["subject_id"])
+    hadm_pos = _positions(index.hadm_ids, labevents["hadm_id"])
+
+    # Shallow copy: the new frame shares the chunk's column buffers
+    df = labevents.copy(deep=False)
+    df["test_name"] = _take_categorical(index.test_names, item_pos)
+    df["gender"] = _take_categorical(index.genders, subject_pos)
+    df["age"] = _take(index.ages, subject_pos, np.nan)
+    df["admittime"] = _take(index.admittimes, hadm_pos, np.datetime64("NaT"))
+    df["dischtime"] = _take(index.dischtimes, hadm_pos, np.datetime64("NaT"))
     return df
+
+
+def join_labevents_with_metadata(
+    labevents: pd.DataFrame,
+    d_labitems: pd.DataFrame,
+    patients: pd.DataFrame,
+    admissions: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Core joins to create a patient- and visit-aware lab dataset.
+    For repeated chunks, build index_dimensions once and call attach_dimensions.
+    """
+    return attach_dimensions(labevents, index_dimensions(d_labitems, patients, admissions))
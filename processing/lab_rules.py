@@ -0,0 +1,189 @@
+"""
+Lab interpretation rule engine
+Classifies numeric lab results as NORMAL / ABNORMAL / CRITICAL against a
+reference-range table keyed by canonical test (see LAB_CANONICAL_MAP),
+sex and unit.
+
+The table is compiled once into a dense NumPy lookup
+(test x sex x unit -> range row), so a whole DataFrame chunk is classified
+with array gathers and comparisons - no per-row Python.
+"""
+
+import numpy as np
+import pandas as pd
+
+from processing.lab_canonical_map import LAB_CANONICAL_MAP
+
+# =====================================================
+# REFERENCE RANGES (adult)
+# =====================================================
+# (canonical test, sex, unit, low, high, critical_low, critical_high)
+# sex: "M", "F" or "" (any). NaN critical limit = none.
+NONE = np.nan
+
+REFERENCE_RANGES = [
+    # Hematology
+    ("Hemoglobin", "M", "g/dL", 13.5, 17.5, 7.0, 20.0),
+    ("Hemoglobin", "F", "g/dL", 12.0, 15.5, 7.0, 20.0),
+    ("Hematocrit", "M", "%", 41.0, 53.0, 20.0, 60.0),
+    ("Hematocrit", "F", "%", 36.0, 46.0, 20.0, 60.0),
+    ("RBC", "M", "m/uL", 4.5, 5.9, NONE, NONE),
+    ("RBC", "F", "m/uL", 4.0, 5.2, NONE, NONE),
+    ("WBC", "", "K/uL", 4.0, 11.0, 2.0, 30.0),
+    ("Platelets", "", "K/uL", 150.0, 400.0, 50.0, 1000.0),
+
+    # Electrolytes
+    ("Sodium", "", "mEq/L", 135.0, 145.0, 120.0, 160.0),
+    ("Sodium", "", "mmol/L", 135.0, 145.0, 120.0, 160.0),
+    ("Potassium", "", "mEq/L", 3.5, 5.1, 2.5, 6.5),
+    ("Potassium", "", "mmol/L", 3.5, 5.1, 2.5, 6.5),
+    ("Chloride", "", "mEq/L", 98.0, 107.0, 80.0, 120.0),
+    ("Chloride", "", "mmol/L", 98.0, 107.0, 80.0, 120.0),
+    ("Bicarbonate", "", "mEq/L", 22.0, 29.0, 10.0, 40.0),
+    ("Bicarbonate", "", "mmol/L", 22.0, 29.0, 10.0, 40.0),
+
+    # Renal
+    ("Creatinine", "M", "mg/dL", 0.7, 1.3, NONE, 10.0),
+    ("Creatinine", "F", "mg/dL", 0.6, 1.1, NONE, 10.0),
+    ("Blood Urea Nitrogen", "", "mg/dL", 7.0, 20.0, NONE, 100.0),
+
+    # Metabolic
+    ("Glucose", "", "mg/dL", 70.0, 99.0, 40.0, 500.0),
+    ("Glucose", "", "mmol/L", 3.9, 5.5, 2.2, 27.8),
+]
+
+# =====================================================
+# STATUS / REASON CODES
+# =====================================================
+
+STATUSES = np.array(["UNKNOWN", "NORMAL", "ABNORMAL", "CRITICAL"], dtype=object)
+
+NO_RANGE, WITHIN_RANGE, BELOW_RANGE, ABOVE_RANGE, CRITICAL_LOW, CRITICAL_HIGH = range(6)
+
+REASON_CODES = np.array([
+    "NO_REFERENCE_RANGE", "WITHIN_RANGE", "BELOW_RANGE",
+    "ABOVE_RANGE", "CRITICAL_LOW", "CRITICAL_HIGH"
+], dtype=object)
+
+# Reason code -> index into STATUSES
+REASON_STATUS = np.array([0, 1, 2, 2, 3, 3], dtype=np.int8)
+
+SEXES = ("M", "F")  # any other value (incl. missing) uses the sex-agnostic range
+
+
+def _normalize_unit(unit) -> str:
+    return str(unit).strip().lower()
+
+
+def _compile(ranges):
+    """Dense lookup arrays for the reference table"""
+    tests = sorted({r[0] for r in ranges})
+    units = sorted({_normalize_unit(r[2]) for r in ranges})
+    test_index = {t: i for i, t in enumerate(tests)}
+    unit_index = {u: i for i, u in enumerate(units)}
+    unit_label = {_normalize_unit(r[2]): r[2] for r in ranges}
+
+    # Range rows: the table itself, plus an envelope (widest limits) for
+    # sex-specific tests when the patient's sex is unknown
+    rows = [list(r) for r in ranges]
+    lookup = np.full((len(tests), len(SEXES) + 1, len(units)), -1, dtype=np.int32)
+
+    for i, (test, sex, unit, *_limits) in enumerate(ranges):
+        t, u = test_index[test], unit_index[_normalize_unit(unit)]
+        if sex:
+            lookup[t, SEXES.index(sex), u] = i
+        else:
+            lookup[t, :, u] = np.where(lookup[t, :, u] < 0, i, lookup[t, :, u])
+
+    for t in range(len(tests)):
+        for u in range(len(units)):
+            if lookup[t, -1, u] >= 0:
+                continue
+            specific = [rows[i] for i in lookup[t, :-1, u] if i >= 0]
+            if specific:
+                lows, highs, crit_lows, crit_highs = np.array([r[3:7] for r in specific]).T
+                rows.append([
+                    tests[t], "", unit_label[units[u]], lows.min(), highs.max(),
+                    crit_lows.min() if np.isnan(crit_lows).all() else np.nanmin(crit_lows),
+                    crit_highs.max() if np.isnan(crit_highs).all() else np.nanmax(crit_highs),
+                ])
+                lookup[t, -1, u] = len(rows) - 1
+
+    limits = np.array([r[3:7] for r in rows], dtype=np.float64)
+    # Per (range row, reason code) reason text, e.g. "ABOVE_RANGE: > 5.1 mEq/L"
+    reasons = np.array([
+        [
+            REASON_CODES[NO_RANGE],
+            f"{REASON_CODES[WITHIN_RANGE]}: {r[3]:g}-{r[4]:g} {r[2]}",
+            f"{REASON_CODES[BELOW_RANGE]}: < {r[3]:g} {r[2]}",
+            f"{REASON_CODES[ABOVE_RANGE]}: > {r[4]:g} {r[2]}",
+            f"{REASON_CODES[CRITICAL_LOW]}: < {r[5]:g} {r[2]}",
+            f"{REASON_CODES[CRITICAL_HIGH]}: > {r[6]:g} {r[2]}",
+        ]
+        for r in rows
+    ] + [list(REASON_CODES)], dtype=object)  # last row: no range matched
+
+    return tests, units, lookup, limits, reasons
+
+
+_TESTS, _UNITS, _LOOKUP, _LIMITS, _REASONS = _compile(REFERENCE_RANGES)
+
+_unranged = set(LAB_CANONICAL_MAP.values()) - set(_TESTS)
+if _unranged:
+    print(f"⚠️ No reference range for: {sorted(_unranged)} (interpreted as UNKNOWN)")
+
+
+# =====================================================
+# CLASSIFIER
+# =====================================================
+
+def _codes(values, categories, normalize=None) -> np.ndarray:
+    """Category codes of values against a fixed vocabulary (-1 = not in it)"""
+    cat = values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype("category")
+    source = cat.cat.categories
+    keys = [normalize(c) for c in source] if normalize else list(source)
+    index = {c: i for i, c in enumerate(categories)}
+    # Map the (few) distinct categories once, then gather per row
+    mapping = np.array([index.get(k, -1) for k in keys] + [-1], dtype=np.int32)
+    return mapping[cat.cat.codes.to_numpy()]  # code -1 (missing) hits the trailing -1
+
+
+def classify(test_name, sex, unit, value):
+    """
+    Vectorized classification.
+    test_name: canonical names, sex: "M"/"F"/other, unit: unit strings,
+    value: floats (all pandas Series of equal length).
+    Returns: (range_row, reason_code) int arrays; range_row -1 = no range
+    """
+    t = _codes(test_name, _TESTS)
+    s = _codes(sex, SEXES)
+    u = _codes(unit, _UNITS, _normalize_unit)
+    v = value.to_numpy(dtype=np.float64, na_value=np.nan)
+
+    known = (t >= 0) & (u >= 0)
+    row = np.full(len(v), -1, dtype=np.int32)
+    row[known] = _LOOKUP[t[known], s[known], u[known]]  # s == -1 -> last slot (any sex)
+
+    low, high, crit_low, crit_high = _LIMITS[row].T  # row -1 gathers a real row; masked below
+
+    # NaN limits compare False, so missing critical limits never fire
+    reason = np.full(len(v), WITHIN_RANGE, dtype=np.int8)
+    reason[v < low] = BELOW_RANGE
+    reason[v > high] = ABOVE_RANGE
+    reason[v < crit_low] = CRITICAL_LOW
+    reason[v > crit_high] = CRITICAL_HIGH
+    reason[(row < 0) | np.isnan(v)] = NO_RANGE
+
+    return row, reason
+
+
+def interpret_labs(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Interpret a lab chunk (test_name canonical, gender, valueuom, valuenum).
+    Adds status (NORMAL / ABNORMAL / CRITICAL / UNKNOWN) and reason.
+    """
+    row, reason = classify(df["test_name"], df["gender"], df["valueuom"], df["valuenum"])
+    return df.assign(
+        status=STATUSES[REASON_STATUS[reason]],
+        reason=_REASONS[row, reason]  # row -1 -> last row (bare codes)
+    )
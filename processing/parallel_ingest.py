@@ -0,0 +1,284 @@
+"""
+Parallel labevents ingestion
+Same stages as processing.ingest, spread over processes:
+
+    reader (this process)   parse CSV chunks, split each by subject_id hash
+      -> N transform workers  join -> select -> interpret -> records
+      -> 1 writer process     insert_lab_results_bulk in bulk_load() mode,
+                              one transaction per chunk (SQLite has one writer)
+
+Each subject always lands on the same worker, so a patient's rows keep
+their file order. Queues are bounded: a slow writer throttles the workers,
+and slow workers throttle the reader, so memory stays at a few chunks.
+"""
+
+import multiprocessing as mp
+import os
+import queue
+import time
+import traceback
+from itertools import chain
+
+import numpy as np
+
+from processing.ingest import (
+    DEFAULT_CHUNK_SIZE, find_table, iter_labevent_chunks, load_dimensions, process_chunk
+)
+from processing.lab_rules import interpret_labs
+from database.repository import bulk_load, get_ingest_checkpoint, insert_lab_results_bulk
+
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# Partitions waiting per worker / record batches waiting for the writer
+WORK_QUEUE_DEPTH = 2
+RESULT_QUEUE_DEPTH = 4
+
+# How often blocked puts check that the other processes are still alive (s)
+LIVENESS_CHECK_SECONDS = 1.0
+
+
+# =====================================================
+# PROCESSES
+# =====================================================
+
+def _transform_worker(worker_id, work_queue, result_queue, stats_queue, dimensions, interpret):
+    rows_in = rows_out = 0
+    busy = 0.0
+    try:
+        while True:
+            item = work_queue.get()
+            if item is None:
+                break
+            chunk_no, partition = item
+            start = time.perf_counter()
+            records = process_chunk(partition, dimensions, interpret)
+            busy += time.perf_counter() - start
+            rows_in += len(partition)
+            rows_out += len(records)
+            # Sent even when empty: the writer counts partitions per chunk
+            result_queue.put(("records", (chunk_no, records)))
+        stats_queue.put(("worker", {"worker": worker_id, "rows_in": rows_in,
+                                    "rows_out": rows_out, "busy": busy}))
+    except Exception:
+        stats_queue.put(("error", f"transform worker {worker_id}:\n{traceback.format_exc()}"))
+        raise
+
+
+def _writer(result_queue, stats_queue, load_id, drop_indexes):
+    """
+    Commits whole chunks in file order, one transaction each, with the
+    checkpoint: a resumed load never re-inserts or skips a partition.
+    Stops once the reader's ("end", total chunks) has arrived and that many
+    chunks are committed.
+    """
+    rows = batches = 0
+    busy = 0.0
+    pending = {}  # chunk_no -> {"parts": expected partitions, "rows_end": ..., "records": [...]}
+    next_chunk = 0
+    total_chunks = None
+    try:
+        with bulk_load(drop_indexes) as conn:
+            while total_chunks is None or next_chunk < total_chunks:
+                kind, payload = result_queue.get()
+                if kind == "chunk":
+                    chunk_no, parts, rows_end = payload
+                    entry = pending.setdefault(chunk_no, {"records": []})
+                    entry["parts"], entry["rows_end"] = parts, rows_end
+                elif kind == "records":
+                    chunk_no, records = payload
+                    pending.setdefault(chunk_no, {"records": []})["records"].append(records)
+                else:
+                    total_chunks = payload
+
+                while (next_chunk in pending
+                       and len(pending[next_chunk]["records"]) == pending[next_chunk].get("parts")):
+                    entry = pending.pop(next_chunk)
+                    records = list(chain.from_iterable(entry["records"]))
+                    start = time.perf_counter()
+                    insert_lab_results_bulk(
+                        records, conn=conn,
+                        checkpoint=(load_id, entry["rows_end"]) if load_id else None
+                    )
+                    busy += time.perf_counter() - start
+                    rows += len(records)
+                    batches += 1
+                    next_chunk += 1
+
+        stats_queue.put(("writer", {"rows": rows, "batches": batches, "busy": busy}))
+    except Exception:
+        stats_queue.put(("error", f"writer:\n{traceback.format_exc()}"))
+        raise
+
+
+def _failure(stats_queue, message: str) -> RuntimeError:
+    """Error for a dead pipeline, with the failing process's traceback if it sent one"""
+    try:
+        kind, payload = stats_queue.get(timeout=LIVENESS_CHECK_SECONDS)
+        if kind == "error":
+            return RuntimeError(f"Parallel ingestion failed in {payload}")
+    except queue.Empty:
+        pass
+    return RuntimeError(message)
+
+
+def _put(q, item, processes, stats_queue):
+    """Blocking put that fails fast if a pipeline process has died"""
+    while True:
+        try:
+            q.put(item, timeout=LIVENESS_CHECK_SECONDS)
+            return
+        except queue.Full:
+            dead = [p.name for p in processes if not p.is_alive()]
+            if dead:
+                raise _failure(stats_queue, f"Ingestion process exited early: {', '.join(dead)}")
+
+
+def partition_by_subject(chunk, n_partitions: int):
+    """Split a chunk into n_partitions frames by subject_id hash (row order kept)"""
+    part = chunk["subject_id"].to_numpy().astype(np.int64) % n_partitions
+    return [chunk.loc[part == i] for i in range(n_partitions)]
+
+
+def _rate(rows, seconds):
+    return round(rows / seconds) if seconds else 0
+
+
+# =====================================================
+# DRIVER
+# =====================================================
+
+def ingest_labevents_parallel(mimic_dir: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                              limit_rows: int = None, workers: int = DEFAULT_WORKERS,
+                              interpret=interpret_labs, load_id: str = None,
+                              drop_indexes: bool = False):
+    """
+    Stream labevents into lab_interpretations using `workers` transform
+    processes and one writer process. interpret must be picklable
+    (a module-level function). load_id / drop_indexes as in ingest_labevents.
+    Returns the ingest_labevents stats plus 'stages': per-stage rows, busy
+    seconds and rows/s (read, transform per worker and total, write).
+    """
+    labevents_path = find_table(mimic_dir, "labevents")
+    dimensions = load_dimensions(mimic_dir)
+    rows_done = get_ingest_checkpoint(load_id) if load_id else 0
+    print(f"✓ Dimension tables loaded; streaming {labevents_path} in chunks of {chunk_size:,} "
+          f"across {workers} workers + 1 writer")
+    if rows_done:
+        print(f"↻ Resuming load '{load_id}' after {rows_done:,} rows")
+
+    ctx = mp.get_context()
+    work_queues = [ctx.Queue(WORK_QUEUE_DEPTH) for _ in range(workers)]
+    result_queue = ctx.Queue(RESULT_QUEUE_DEPTH)
+    stats_queue = ctx.Queue()
+
+    processes = [
+        ctx.Process(target=_transform_worker, name=f"ingest-worker-{i}",
+                    args=(i, work_queues[i], result_queue, stats_queue, dimensions, interpret))
+        for i in range(workers)
+    ]
+    processes.append(ctx.Process(target=_writer, name="ingest-writer",
+                                 args=(result_queue, stats_queue, load_id, drop_indexes)))
+
+    start = time.perf_counter()
+    for p in processes:
+        p.start()
+
+    rows_read = chunks = 0
+    read_busy = 0.0
+    try:
+        reader = iter_labevent_chunks(labevents_path, chunk_size, skip_rows=rows_done)
+        while True:
+            t0 = time.perf_counter()
+            chunk = next(reader, None)
+            if chunk is not None and limit_rows is not None:
+                chunk = chunk.iloc[:max(0, limit_rows - rows_read)]
+                if chunk.empty:
+                    chunk = None
+            if chunk is None:
+                break
+            partitions = partition_by_subject(chunk, workers)
+            read_busy += time.perf_counter() - t0
+
+            rows_read += len(chunk)
+            dispatch = [(q, part) for q, part in zip(work_queues, partitions) if not part.empty]
+            _put(result_queue, ("chunk", (chunks, len(dispatch), rows_done + rows_read)),
+                 processes, stats_queue)
+            for work_queue, partition in dispatch:
+                _put(work_queue, (chunks, partition), processes, stats_queue)
+
+            chunks += 1
+            elapsed = time.perf_counter() - start
+            print(f"  chunk {chunks}: {rows_read:,} read ({rows_read / elapsed:,.0f} rows/s)")
+
+        # End of input: the writer stops after this many chunks
+        _put(result_queue, ("end", chunks), processes, stats_queue)
+        for work_queue in work_queues:
+            _put(work_queue, None, processes, stats_queue)
+
+        # Wait for every process's summary, watching for crashes meanwhile
+        writer_stats, worker_stats = None, []
+        while writer_stats is None or len(worker_stats) < workers:
+            # Checked before the get: anything a dead process sent is already queued
+            reported = {f"ingest-worker-{w['worker']}" for w in worker_stats}
+            if writer_stats is not None:
+                reported.add("ingest-writer")
+            dead = [p.name for p in processes if p.name not in reported and not p.is_alive()]
+            try:
+                kind, payload = stats_queue.get(timeout=LIVENESS_CHECK_SECONDS)
+            except queue.Empty:
+                if dead:
+                    raise RuntimeError(f"Ingestion process exited without a summary: {', '.join(dead)}")
+                continue
+            if kind == "error":
+                raise RuntimeError(f"Parallel ingestion failed in {payload}")
+            if kind == "writer":
+                writer_stats = payload
+            else:
+                worker_stats.append(payload)
+
+        for p in processes:
+            p.join()
+    except BaseException:
+        # Nobody will read what is still buffered for the workers; don't
+        # block interpreter exit flushing it
+        for q in work_queues + [result_queue]:
+            q.cancel_join_thread()
+        raise
+    finally:
+        for p in processes:
+            if p.is_alive():
+                p.terminate()
+                p.join()
+
+    elapsed = time.perf_counter() - start
+    worker_stats.sort(key=lambda w: w["worker"])
+    transform_rows = sum(w["rows_in"] for w in worker_stats)
+    transform_busy = sum(w["busy"] for w in worker_stats)
+
+    return {
+        "rows_read": rows_read,
+        "rows_written": writer_stats["rows"],
+        "chunks": chunks,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": _rate(rows_read, elapsed),
+        "resumed_from": rows_done,
+        "stages": {
+            "read": {"rows": rows_read, "busy_seconds": round(read_busy, 2),
+                     "rows_per_second": _rate(rows_read, read_busy)},
+            "transform": {
+                "rows": transform_rows,
+                "busy_seconds": round(transform_busy, 2),
+                # Per worker busy time, so this is the rate of one core
+                "rows_per_second": _rate(transform_rows, transform_busy),
+                "workers": [
+                    {"worker": w["worker"], "rows": w["rows_in"],
+                     "busy_seconds": round(w["busy"], 2),
+                     "rows_per_second": _rate(w["rows_in"], w["busy"])}
+                    for w in worker_stats
+                ]
+            },
+            "write": {"rows": writer_stats["rows"], "batches": writer_stats["batches"],
+                      "busy_seconds": round(writer_stats["busy"], 2),
+                      "rows_per_second": _rate(writer_stats["rows"], writer_stats["busy"])}
+        }
+    }
@@ -1,8 +1,22 @@
 import pandas as pd # type: ignore
 
-def load_csv(path: str) -> pd.DataFrame:
+def load_csv(path: str, **read_csv_kwargs) -> pd.DataFrame:
     try:
-        df = pd.read_csv(path)
+        df = pd.read_csv(path, **read_csv_kwargs)
         return df
     except Exception as e:
         raise RuntimeError(f"Failed to load CSV: {path}") from e
+
+
+def iter_csv_chunks(path: str, chunk_size: int, **read_csv_kwargs):
+    """
+    Yield a large CSV as DataFrames of at most chunk_size rows
+    (memory stays bounded by the chunk, not the file).
+    """
+    try:
+        reader = pd.read_csv(path, chunksize=chunk_size, **read_csv_kwargs)
+    except Exception as e:
+        raise RuntimeError(f"Failed to open CSV: {path}") from e
+
+    with reader:
+        yield from reader
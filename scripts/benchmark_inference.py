@@ -0,0 +1,59 @@
+"""
+Per-call latency of the sklearn risk model vs the compiled flat-array forest
+Run this from the project root: python scripts/benchmark_inference.py [n_calls]
+"""
+
+import sys
+import time
+sys.path.insert(0, '.')
+
+import numpy as np
+
+from ai.risk_model import load_model, export_compiled_model
+
+
+def time_per_call(fn, X, n_calls):
+    fn(X)  # warm-up
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        fn(X)
+    return (time.perf_counter() - start) / n_calls
+
+
+def run(n_calls: int):
+    model, scaler, feature_cols = load_model()
+    if model is None:
+        print("❌ Model not trained. Run scripts/train_model.py first.")
+        return
+
+    compiled = export_compiled_model(model, scaler)
+
+    def sklearn_path(X):
+        return model.predict_proba(scaler.transform(X))
+
+    rng = np.random.default_rng(0)
+    # Rows around the training distribution so every branch gets exercised
+    X_eval = scaler.mean_ + rng.normal(0, 1.5, (5000, len(feature_cols))) * scaler.scale_
+
+    max_diff = np.abs(sklearn_path(X_eval) - compiled.predict_proba(X_eval)).max()
+    same_class = np.array_equal(model.predict(scaler.transform(X_eval)), compiled.predict(X_eval))
+    print(f"Model: {len(model.estimators_)} trees, {len(feature_cols)} features, "
+          f"{len(compiled.feature)} nodes")
+    print(f"Outputs on {len(X_eval)} rows: max |Δproba| = {max_diff:.2e}, identical classes = {same_class}")
+    print("-" * 60)
+    print(f"{'batch':>8} {'sklearn':>14} {'compiled':>14} {'speedup':>9}")
+
+    for batch in (1, 10, 100, 1000):
+        X = X_eval[:batch]
+        calls = max(3, n_calls // batch)
+        sk = time_per_call(sklearn_path, X, calls)
+        cf = time_per_call(compiled.predict_proba, X, calls)
+        print(f"{batch:>8} {sk * 1e3:>11.3f} ms {cf * 1e3:>11.3f} ms {sk / cf:>8.1f}x")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("RISK MODEL INFERENCE LATENCY: SKLEARN vs COMPILED FOREST")
+    print("=" * 60)
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
+    print("=" * 60)
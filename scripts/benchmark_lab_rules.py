@@ -0,0 +1,87 @@
+"""
+Compare a row-by-row Python interpreter with the vectorized
+processing.lab_rules.interpret_labs on synthetic lab rows.
+Run this from the project root: python scripts/benchmark_lab_rules.py [n_rows ...]
+"""
+
+import sys
+import time
+sys.path.insert(0, '.')
+
+import numpy as np
+import pandas as pd
+
+from processing.lab_rules import REFERENCE_RANGES, interpret_labs
+
+
+def make_synthetic_labs(n_rows: int, seed: int = 42) -> pd.DataFrame:
+    """Random results spread around each test's reference range"""
+    rng = np.random.default_rng(seed)
+    pick = rng.integers(0, len(REFERENCE_RANGES), n_rows)
+    low = np.array([r[3] for r in REFERENCE_RANGES])[pick]
+    high = np.array([r[4] for r in REFERENCE_RANGES])[pick]
+    sexes = np.array([r[1] or "M" for r in REFERENCE_RANGES])[pick]
+    return pd.DataFrame({
+        'test_name': np.array([r[0] for r in REFERENCE_RANGES])[pick],
+        'gender': pd.Categorical(np.where(rng.random(n_rows) < 0.05, None, sexes)),
+        'valueuom': pd.Categorical(np.array([r[2] for r in REFERENCE_RANGES])[pick]),
+        'valuenum': rng.normal((low + high) / 2, (high - low) * 1.5).round(2)
+    })
+
+
+def row_by_row_status(df: pd.DataFrame) -> list:
+    """One Python call per row against a dict of ranges"""
+    ranges = {(r[0], r[1], r[2].lower()): r[3:] for r in REFERENCE_RANGES}
+
+    def interpret(row):
+        unit = str(row['valueuom']).strip().lower()
+        sex = row['gender'] if row['gender'] in ("M", "F") else ""
+        limits = ranges.get((row['test_name'], sex, unit)) or ranges.get((row['test_name'], "", unit))
+        if limits is None and not sex:
+            specific = [ranges.get((row['test_name'], s, unit)) for s in ("M", "F")]
+            specific = [s for s in specific if s]
+            if specific:
+                limits = (min(s[0] for s in specific), max(s[1] for s in specific),
+                          min(s[2] for s in specific), max(s[3] for s in specific))
+        if limits is None or pd.isna(row['valuenum']):
+            return "UNKNOWN"
+        low, high, crit_low, crit_high = limits
+        value = row['valuenum']
+        if value < crit_low or value > crit_high:
+            return "CRITICAL"
+        if value < low or value > high:
+            return "ABNORMAL"
+        return "NORMAL"
+
+    return df.apply(interpret, axis=1).tolist()
+
+
+def run(n_rows: int):
+    df = make_synthetic_labs(n_rows)
+    print(f"Synthetic data: {n_rows:,} lab rows")
+
+    start = time.perf_counter()
+    legacy = row_by_row_status(df) if n_rows <= 200_000 else None
+    legacy_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = interpret_labs(df)
+    vectorized_s = time.perf_counter() - start
+
+    if legacy is not None:
+        same = legacy == vectorized['status'].tolist()
+        print(f"  row by row  : {legacy_s * 1000:10.1f} ms  ({n_rows / legacy_s:,.0f} rows/s)")
+    print(f"  vectorized  : {vectorized_s * 1000:10.1f} ms  ({n_rows / vectorized_s:,.0f} rows/s)")
+    if legacy is not None:
+        print(f"  identical statuses={same}  ({legacy_s / vectorized_s:.0f}x faster)")
+    print(f"  {vectorized['status'].value_counts().to_dict()}")
+
+
+if __name__ == '__main__':
+    sizes = [int(a) for a in sys.argv[1:]] or [100_000, 1_000_000, 5_000_000]
+    print("=" * 60)
+    print("LAB INTERPRETATION: ROW BY ROW vs VECTORIZED")
+    print("=" * 60)
+    for n in sizes:
+        run(n)
+    print("=" * 60)
@@ -0,0 +1,91 @@
+"""
+Compare the legacy per-subject loop used by prepare_training_data with the
+vectorized build_training_frame on synthetic lab rows.
+Run this from the project root: python scripts/benchmark_training_features.py [n_patients]
+"""
+
+import sys
+import time
+sys.path.insert(0, '.')
+
+import numpy as np
+import pandas as pd
+
+from ai.config import SUPPORTED_LAB_TESTS
+from ai.risk_model import build_training_frame
+
+
+def make_synthetic_labs(n_patients: int, labs_per_patient: int = 25, seed: int = 42) -> pd.DataFrame:
+    """Random lab rows, interleaved across patients like a real ingestion order"""
+    rng = np.random.default_rng(seed)
+    n_rows = n_patients * labs_per_patient
+    return pd.DataFrame({
+        'subject_id': rng.integers(10_000_000, 10_000_000 + n_patients, n_rows),
+        'test_name': rng.choice(SUPPORTED_LAB_TESTS, n_rows),
+        'value': rng.normal(100, 30, n_rows).round(2),
+        'status': rng.choice(['NORMAL', 'ABNORMAL', 'CRITICAL'], n_rows, p=[0.8, 0.15, 0.05])
+    })
+
+
+def legacy_training_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """The original O(patients x rows) loop from prepare_training_data"""
+    pivot_data = []
+
+    for subject_id in df['subject_id'].unique():
+        patient_data = df[df['subject_id'] == subject_id]
+
+        features = {'subject_id': subject_id}
+        for _, row in patient_data.iterrows():
+            test_name = row['test_name'].lower().replace(' ', '_').replace('-', '_')
+            features[f'{test_name}_value'] = row['value']
+
+        max_risk = 0
+        if 'CRITICAL' in patient_data['status'].values:
+            max_risk = 2
+        elif 'ABNORMAL' in patient_data['status'].values:
+            max_risk = 1
+
+        features['risk_level'] = max_risk
+        pivot_data.append(features)
+
+    return pd.DataFrame(pivot_data)
+
+
+def feature_cols_of(frame: pd.DataFrame):
+    return [c for c in frame.columns if c not in ['subject_id', 'risk_level']]
+
+
+def run(n_patients: int):
+    df = make_synthetic_labs(n_patients)
+    print(f"Synthetic data: {n_patients} patients, {len(df)} lab rows")
+
+    start = time.perf_counter()
+    legacy = legacy_training_frame(df)
+    legacy_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = build_training_frame(df)
+    vectorized_s = time.perf_counter() - start
+
+    cols = feature_cols_of(legacy)
+    same_cols = cols == feature_cols_of(vectorized)
+    same_ids = np.array_equal(legacy['subject_id'].values, vectorized['subject_id'].values)
+    same_labels = np.array_equal(legacy['risk_level'].values, vectorized['risk_level'].values)
+    same_values = np.allclose(
+        legacy[cols].values.astype(float), vectorized[cols].values, equal_nan=True
+    )
+
+    print(f"  legacy loop : {legacy_s * 1000:10.1f} ms")
+    print(f"  vectorized  : {vectorized_s * 1000:10.1f} ms  ({legacy_s / vectorized_s:.0f}x faster)")
+    print(f"  identical feature_cols={same_cols} subjects={same_ids} "
+          f"labels={same_labels} values={same_values}")
+
+
+if __name__ == '__main__':
+    sizes = [int(a) for a in sys.argv[1:]] or [500, 2000, 5000]
+    print("=" * 60)
+    print("TRAINING FEATURE BUILD: LEGACY LOOP vs VECTORIZED PIVOT")
+    print("=" * 60)
+    for n in sizes:
+        run(n)
+    print("=" * 60)
@@ -0,0 +1,59 @@
+"""
+Stream MIMIC-IV labevents into lab_interpretations
+Run this from the project root:
+    python scripts/ingest_labevents.py <mimic_dir> [--chunk-size N] [--limit-rows N] [--workers N]
+                                       [--load-id ID] [--drop-indexes]
+
+<mimic_dir> holds labevents, d_labitems, patients and admissions
+(.csv or .csv.gz, directly or under hosp/). --workers 1 runs the
+single-process pipeline; more uses processing.parallel_ingest.
+--load-id checkpoints progress: rerun with the same id to resume an
+interrupted load. --drop-indexes rebuilds secondary indexes and the
+trigger-maintained tables (lab_aggregates, report rollups) once at the end.
+"""
+
+import argparse
+import sys
+sys.path.insert(0, '.')
+
+from database.models import create_tables
+from processing.ingest import DEFAULT_CHUNK_SIZE, ingest_labevents
+from processing.parallel_ingest import DEFAULT_WORKERS, ingest_labevents_parallel
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Streaming labevents ingestion")
+    parser.add_argument("mimic_dir")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--limit-rows", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--load-id", default=None)
+    parser.add_argument("--drop-indexes", action="store_true")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("LABEVENTS INGESTION (STREAMING)")
+    print("=" * 60)
+    create_tables()
+    if args.workers > 1:
+        stats = ingest_labevents_parallel(args.mimic_dir, args.chunk_size, args.limit_rows,
+                                          args.workers, load_id=args.load_id,
+                                          drop_indexes=args.drop_indexes)
+    else:
+        stats = ingest_labevents(args.mimic_dir, args.chunk_size, args.limit_rows,
+                                 load_id=args.load_id, drop_indexes=args.drop_indexes)
+    print("-" * 60)
+    if stats["resumed_from"]:
+        print(f"Resumed after: {stats['resumed_from']:,} rows")
+    print(f"Rows read:    {stats['rows_read']:,} in {stats['chunks']} chunks")
+    print(f"Rows written: {stats['rows_written']:,}")
+    print(f"Throughput:   {stats['rows_per_second']:,} rows/s ({stats['seconds']} s)")
+    if "stages" in stats:
+        stages = stats["stages"]
+        print("Per stage (rows/s while busy):")
+        print(f"  read:      {stages['read']['rows_per_second']:>12,}  ({stages['read']['busy_seconds']} s)")
+        for w in stages["transform"]["workers"]:
+            print(f"  worker {w['worker']:<3}{w['rows_per_second']:>12,}  "
+                  f"({w['rows']:,} rows, {w['busy_seconds']} s)")
+        print(f"  write:     {stages['write']['rows_per_second']:>12,}  "
+              f"({stages['write']['batches']} batches, {stages['write']['busy_seconds']} s)")
+    print("=" * 60)
@@ -1,6 +1,10 @@
 """
 Script to train the risk prediction model
-Run this from the project root: python scripts/train_model.py
+Run this from the project root: python scripts/train_model.py [--streaming | --feature-store | --aggregates]
+
+--streaming      builds features chunk by chunk (for lab tables larger than RAM)
+--feature-store  slices the incrementally maintained per-patient feature store
+--aggregates     adds rolling min/max/mean/count/change features per test
 """
 
 import sys
@@ -12,7 +16,15 @@ if __name__ == '__main__':
     print("=" * 50)
     print("PATIENT RISK PREDICTION MODEL TRAINING")
     print("=" * 50)
-    success = train_risk_model()
+    if '--streaming' in sys.argv:
+        source = 'streaming'
+    elif '--feature-store' in sys.argv:
+        source = 'store'
+    elif '--aggregates' in sys.argv:
+        source = 'aggregates'
+    else:
+        source = 'table'
+    success = train_risk_model(source=source)
     print("=" * 50)
     if success:
         print("✅ Model training completed successfully!")
@@ -0,0 +1,93 @@
+"""
+Check that the unreviewed critical alert queries use their partial indexes.
+Captures the SQL that report_service actually runs (first page, cursor page,
+test / subject filters, dashboard alerts) and fails if EXPLAIN QUERY PLAN
+does not search the expected idx_lab_unreviewed_critical* index or needs a
+temp B-tree to sort.
+Run this from the project root: python scripts/verify_query_plans.py
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+from database.db import get_read_connection
+from database.models import create_tables
+from app.services import report_service
+
+
+def captured_statements(fn, *args, **kwargs):
+    """Run fn with report_service reads traced; returns the executed SQL (values inlined)"""
+    statements = []
+    traced = []
+
+    def traced_connection():
+        conn = get_read_connection()
+        conn.set_trace_callback(statements.append)
+        traced.append(conn)
+        return conn
+
+    original = report_service.get_db
+    report_service.get_db = traced_connection
+    try:
+        fn(*args, **kwargs)
+    finally:
+        report_service.get_db = original
+        # Pooled connections outlive the call
+        for conn in traced:
+            conn.set_trace_callback(None)
+    # The paged alert reads (not the COUNT summaries)
+    return [s for s in statements if "reviewed = 0" in s and "ORDER BY" in s]
+
+
+def query_plan(sql: str) -> list:
+    conn = get_read_connection()
+    try:
+        return [row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    finally:
+        conn.close()
+
+
+def check(name: str, statements: list, index: str) -> bool:
+    ok = bool(statements)
+    for sql in statements:
+        plan = query_plan(sql)
+        uses_index = any(f"USING INDEX {index} " in d or f"USING COVERING INDEX {index} " in d
+                         or d.endswith(f"INDEX {index}") for d in plan)
+        sorts = any("TEMP B-TREE" in d for d in plan)
+        ok = ok and uses_index and not sorts
+        if not uses_index or sorts:
+            print(f"    plan: {plan}")
+    print(f"  {'✓' if ok else '✗'} {name} ({len(statements)} statements, {index})")
+    return ok
+
+
+if __name__ == '__main__':
+    create_tables()
+    first = report_service.unreviewed_critical(limit=2)
+    cursor = first["next_cursor"] or report_service._encode_alert_cursor(
+        {"processed_time": "9999-12-31T00:00:00", "id": 1 << 62})
+    tail_cursor = report_service._encode_alert_cursor({"processed_time": None, "id": 1 << 62})
+
+    print("=" * 60)
+    print("QUERY PLANS: UNREVIEWED CRITICAL ALERTS")
+    print("=" * 60)
+    results = [
+        check("first page", captured_statements(
+            report_service.unreviewed_critical, limit=2), "idx_lab_unreviewed_critical"),
+        check("cursor page", captured_statements(
+            report_service.unreviewed_critical, limit=2, cursor=cursor),
+            "idx_lab_unreviewed_critical"),
+        check("untimed tail page", captured_statements(
+            report_service.unreviewed_critical, limit=2, cursor=tail_cursor),
+            "idx_lab_unreviewed_critical"),
+        check("test filter", captured_statements(
+            report_service.unreviewed_critical, limit=2, cursor=cursor, test_name="Potassium"),
+            "idx_lab_unreviewed_critical_test"),
+        check("subject filter", captured_statements(
+            report_service.unreviewed_critical, limit=2, cursor=cursor, subject_id=1),
+            "idx_lab_unreviewed_critical_subject"),
+        check("dashboard alerts", captured_statements(
+            report_service.report_dashboard.uncached), "idx_lab_unreviewed_critical"),
+    ]
+    print("=" * 60)
+    sys.exit(0 if all(results) else 1)